@@ -0,0 +1,111 @@
+import threading
+import time
+
+# === Aggregation Configuration ===
+DEFAULT_WINDOW = 1.0  # seconds, the dashboard plots at 1 s resolution
+DEFAULT_KEEPALIVE = 60.0  # seconds after which an unchanged raw value is sent again
+
+
+# === Tumbling windows ===
+class Window:
+    """ Running min/max/mean/last/count of one PID over one window, updated per sample """
+
+    def __init__(self, start):
+        self.start = start
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.last = None
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.last = value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def summary(self, name, length):
+        return {
+            "command": name,
+            "value": self.last,
+            "min": self.min,
+            "max": self.max,
+            "mean": round(self.total / self.count, 3),
+            "count": self.count,
+            "window": length,
+        }
+
+
+class Aggregator:
+    """
+        Sits between the OBD callbacks and the uplink. Numeric samples are
+        folded into per-PID tumbling windows, and only one summary per window
+        is emitted, keeping min/max so peaks survive. Commands listed as raw,
+        and values that aren't numbers (like DTC lists), aren't aggregated:
+        they are emitted when they change, and again every `keepalive` seconds.
+    """
+
+    def __init__(self, emit, windows=None, raw=(), keepalive=DEFAULT_KEEPALIVE):
+        self.emit = emit  # called with a dict, a window summary or a raw sample
+        self.windows = windows or {}  # PID name: window length in seconds
+        self.raw = set(raw)
+        self.keepalive = keepalive
+        self.received = 0
+        self.emitted = 0
+        self.__open = {}  # PID name: Window
+        self.__last_raw = {}  # PID name: (value, when it was last emitted)
+        self.__lock = threading.Lock()  # samples come from the OBD thread, flushes from the event loop
+
+    def window_for(self, name):
+        return self.windows.get(name, self.windows.get("default", DEFAULT_WINDOW))
+
+    def add(self, name, value, timestamp=None):
+        self.received += 1
+        now = time.monotonic() if timestamp is None else timestamp
+        if name in self.raw or not isinstance(value, (int, float)) or isinstance(value, bool):
+            with self.__lock:
+                last = self.__last_raw.get(name)
+                if last is not None and last[0] == value and now - last[1] < self.keepalive:
+                    return
+                self.__last_raw[name] = (value, now)
+            self.__emit({"command": name, "value": value})
+            return
+
+        length = self.window_for(name)
+        with self.__lock:
+            window = self.__open.get(name)
+            if window is not None and now - window.start >= length:
+                summary = window.summary(name, length)
+                window = None
+            else:
+                summary = None
+            if window is None:
+                window = self.__open[name] = Window(now)
+            window.add(value)
+
+        if summary is not None:
+            self.__emit(summary)
+
+    def flush(self, now=None, force=False):
+        """
+            Emits the windows that have ended (all open windows with force), for PIDs that went quiet.
+            After a forced flush (parking, a lost connection) the next raw values are sent even if unchanged.
+        """
+        now = time.monotonic() if now is None else now
+        with self.__lock:
+            if force:
+                self.__last_raw = {}
+            done = [(name, window) for name, window in self.__open.items()
+                    if force or now - window.start >= self.window_for(name)]
+            for name, _ in done:
+                del self.__open[name]
+
+        for name, window in done:
+            self.__emit(window.summary(name, self.window_for(name)))
+
+    def __emit(self, data):
+        self.emitted += 1
+        self.emit(data)
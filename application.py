@@ -1,5 +1,7 @@
 import asyncio
 import json
+import logging
+import os
 import random
 import subprocess
 import threading
@@ -7,9 +9,15 @@ import time
 
 import obd
 import serial
-import websockets
 from rpi_ws281x import PixelStrip, Color
 
+import codec
+import logs
+from aggregator import Aggregator
+from derived import Derived, DerivedEngine, Integral
+from rules import Rule, RulesEngine
+from uplink import Connector, DatagramSender
+
 # === Application Configuration ===
 LED_COUNT = 30
 LED_PIN = 18
@@ -18,45 +26,315 @@ LED_DMA = 10
 LED_BRIGHTNESS = 255
 LED_INVERT = False
 LED_CHANNEL = 0
-RECONNECT_OBD = 30
+RECONNECT_OBD_MIN = 2  # seconds before retrying, doubled on every failed attempt
+RECONNECT_OBD_MAX = 120
+IGNITION_VOLTAGE = 13.2  # alternator charging, the engine is running
+CRANK_VOLTAGE_RISE = 0.5  # rise over the parked voltage that means the ignition came on
+ENGINE_OFF_VOLTAGE = 13.0  # below this, with no RPM, the engine is off
+PARK_AFTER = 60  # seconds the engine must stay off before parking
+PARKED_POLL = 5  # seconds the adapter sleeps (ATLP) between voltage reads while parked
+HEARTBEAT_INTERVAL = 60  # seconds between HEARTBEAT frames while parked
+OBD_ADAPTER_MAC = "DD:0D:30:48:A4:9C"
+OBD_PORT = f"rfcomm://{OBD_ADAPTER_MAC}"  # or "/dev/rfcomm0", "record://<port>?file=drive.obdlog"
+OBD_LINK_PROFILE = True  # ATS0, adaptive timing and a measured ATST, verified per connection
+OBD_PHYSICAL_ADDRESSING = True  # send engine PIDs to the engine ECU only, instead of broadcasting
+OBD_FUNCTIONAL_INTERVAL = 10  # poll cycles between two broadcast queries (DTCs), each costs 2 AT SH switches
+OBD_CALLBACK_QUEUE = 256  # readings buffered for the callback thread, 0 runs callbacks on the polling thread
+OBD_HISTORY_SIZE = 600  # samples of history kept per watched PID, for connection.history()
+AGGREGATE_WINDOWS = {"default": 1.0, "COOLANT_TEMP": 5.0, "INTAKE_TEMP": 5.0, "ELM_VOLTAGE": 5.0}  # seconds, {} sends every sample
+RAW_COMMANDS = {"GET_CURRENT_DTC"}  # never aggregated, sent when they change
+RAW_KEEPALIVE = 60  # seconds after which an unchanged raw value is sent again
+UPLINK_BATCH = 0  # seconds; when set, numeric readings go out as compressed binary batches (codec.py)
+LIVE_UPLINK = None  # ("host", port) to also send every sample of LIVE_COMMANDS as UDP datagrams, e.g. ("ws.sonny.ro", 9999)
+LIVE_COMMANDS = {"RPM", "SPEED", "THROTTLE_POS"}
+AIR_FUEL_RATIO = 14.7  # stoichiometric, petrol
+FUEL_DENSITY = 745.0  # g/L, petrol
+
+# === Derived Channels ===
+# computed on the Pi from the polled PIDs, and sent like any other command
+DERIVED_CHANNELS = [
+    Derived("FUEL_RATE_MAF", ["MAF"], lambda maf: maf / AIR_FUEL_RATIO / FUEL_DENSITY * 3600),  # L/h
+    Derived("FUEL_ECONOMY", ["FUEL_RATE_MAF", "SPEED"],
+            lambda rate, speed: rate / speed * 100 if speed > 5 else None),  # L/100km, while moving
+    Integral("TRIP_DISTANCE", ["SPEED"], lambda speed: speed, per=3600),  # km
+    Integral("TRIP_FUEL", ["FUEL_RATE_MAF"], lambda rate: rate, per=3600),  # L
+    Integral("IDLE_TIME", ["RPM", "SPEED"], lambda rpm, speed: 1.0 if rpm > 0 and speed == 0 else 0.0),  # s
+]
+
+# === Local Rules ===
+# LED alerts decided on the Pi, within a poll cycle and without the server
+RULES = [
+    Rule("overheating", "COOLANT_TEMP", "hazard", above=110, clear_below=105, hold=5),
+    Rule("check_engine", "GET_CURRENT_DTC", "hazard", when=lambda dtcs: dtcs != "[]"),
+    Rule("over_rev", "RPM", "pit", above=6000, clear_below=5500),
+]
 WEBSOCKET_URL = "wss://ws.sonny.ro"
-
-strip = PixelStrip(LED_COUNT, LED_PIN, LED_FREQ_HZ, LED_DMA, LED_INVERT, LED_BRIGHTNESS, LED_CHANNEL)
-strip.begin()
-NUM_PIXELS = strip.numPixels()
+RECONNECT_WS_MIN = 0.1  # seconds, ceiling of the first jittered retry, doubled on every failed attempt
+RECONNECT_WS_MAX = 30
+WEBSOCKET_PING_INTERVAL = 5  # seconds between keepalive pings
+WEBSOCKET_PING_TIMEOUT = 5  # seconds without a pong before the link is considered dead
+WEBSOCKET_STABLE_TIME = 30  # seconds a connection must last before retries start near zero again
+METRICS_INTERVAL = 0  # seconds between METRICS frames, 0 disables instrumentation
+LOG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs", "obd-tracker.log")
+LOG_MAX_BYTES = 1024 * 1024  # rotated at this size
+LOG_BACKUPS = 3
+LOG_LEVELS = {"obd": logging.WARNING}
+LOG_LIMITS = {"app.uplink": (1, 5), "app.ws": (1, 10), "obd": (5, 50)}  # category: (records per second, burst)
+LOG_SAMPLING = {"app.uplink": 50}  # category: keep one record in n
 
 # === Globals ===
+strip = None
+NUM_PIXELS = LED_COUNT
 current_mode = "police"
+mode_before_park = current_mode
+parked = False
+active_rules = {}  # rule name: LED mode, of the local rules firing, oldest first
+mode_before_rules = current_mode
+extra_commands = set()  # names of PIDs the server asked to watch on top of the defaults
 websocket = None
+logger = logging.getLogger("app")
+obd_logger = logging.getLogger("app.obd")
+led_logger = logging.getLogger("app.leds")
+ws_logger = logging.getLogger("app.ws")
+uplink_logger = logging.getLogger("app.uplink")  # every message sent, debug only
+connector = Connector(WEBSOCKET_URL, backoff_min=RECONNECT_WS_MIN, backoff_max=RECONNECT_WS_MAX,
+                      ping_interval=WEBSOCKET_PING_INTERVAL, ping_timeout=WEBSOCKET_PING_TIMEOUT,
+                      stable_time=WEBSOCKET_STABLE_TIME)
+
+
+def setup_logging(role=None):
+    """ One rotated log file per process, the supervisor's roles each get their own """
+    path = LOG_FILE if role is None else LOG_FILE.replace(".log", f"-{role}.log")
+    logs.setup(path, LOG_MAX_BYTES, LOG_BACKUPS, LOG_LEVELS, LOG_LIMITS, LOG_SAMPLING)
+
+
+def init_strip():
+    global strip, NUM_PIXELS
+    strip = PixelStrip(LED_COUNT, LED_PIN, LED_FREQ_HZ, LED_DMA, LED_INVERT, LED_BRIGHTNESS, LED_CHANNEL)
+    strip.begin()
+    NUM_PIXELS = strip.numPixels()
 
 
 # === OBD-II Handler ===
-async def obd_handler():
+async def connect_obd(on_progress):
+    """
+        Opens the OBD connection on a worker thread. Baud rate detection, ATZ,
+        protocol search and loading the supported PIDs block for seconds,
+        so they must not run on the event loop the websocket lives on.
+        Returns the connection if at least the adapter answered, else None.
+    """
+    loop = asyncio.get_running_loop()
+    on_progress("connecting")
+    connection = await loop.run_in_executor(None, lambda: obd.Async(
+        OBD_PORT, delay_cmds=0.25, link_profile=OBD_LINK_PROFILE,
+        physical_addressing=OBD_PHYSICAL_ADDRESSING, dispatch_size=OBD_CALLBACK_QUEUE,
+        history_size=OBD_HISTORY_SIZE, functional_interval=OBD_FUNCTIONAL_INTERVAL))
+
+    if connection.is_connected():
+        on_progress("connected")
+        return connection
+
+    # the adapter may answer while the car (ignition) doesn't
+    if connection.status() in (obd.OBDStatus.ELM_CONNECTED, obd.OBDStatus.OBD_CONNECTED):
+        on_progress("no_car")
+        return connection
+
+    on_progress("failed")
+    await loop.run_in_executor(None, connection.close)
+    return None
+
+
+def ignition_detected(voltage, baseline):
+    if voltage >= IGNITION_VOLTAGE or voltage - baseline >= CRANK_VOLTAGE_RISE:
+        obd_logger.info("Ignition detected at %.1fV", voltage)
+        return True
+    return False
+
+
+def engine_running(connection):
+    """ From the latest polled values: RPM, or the alternator still charging """
+    rpm = connection.query(obd.commands.RPM).value
+    if rpm is not None and rpm.magnitude > 0:
+        return True
+    voltage = connection.query(obd.commands.ELM_VOLTAGE).value
+    return voltage is not None and voltage.magnitude >= ENGINE_OFF_VOLTAGE
+
+
+async def sleep_while_parked(connection, publish):
+    """
+        Stops polling and puts the adapter in low power (ATLP) between voltage
+        reads; the read itself wakes it back up. Publishes a HEARTBEAT now and
+        then. Returns True when the voltage rises, False if the adapter went away.
+    """
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, connection.stop)
+
+    baseline = None
+    last_heartbeat = 0
+    while True:
+        await loop.run_in_executor(None, connection.low_power)
+        await asyncio.sleep(PARKED_POLL)
+
+        voltage = await loop.run_in_executor(None, connection.interface.read_voltage)
+        if voltage is None:
+            return False
+        if loop.time() - last_heartbeat >= HEARTBEAT_INTERVAL:
+            last_heartbeat = loop.time()
+            publish(json.dumps({"command": "HEARTBEAT", "value": voltage}))
+
+        if baseline is None or voltage < baseline:
+            baseline = voltage
+        if ignition_detected(voltage, baseline):
+            return True
+
+
+async def obd_handler(publish=None, on_park=None, on_rule=None):
     loop = asyncio.get_running_loop()
 
+    if publish is None:
+        # single process: hand readings straight to the websocket coroutine
+        def publish(message):
+            asyncio.run_coroutine_threadsafe(send_data(message), loop)
+
+    if on_park is None:
+        on_park = park_leds
+
+    if on_rule is None:
+        on_rule = show_rule
+
+    def on_progress(status):
+        obd_logger.info("OBD-II: %s", status)
+        publish(json.dumps({"command": "OBD_STATUS", "value": status}))
+
+    batch = codec.Batch() if UPLINK_BATCH else None
+    batch_sent = loop.time()
+
+    def send_reading(data):
+        value = data["value"]
+        if batch is None or not isinstance(value, (int, float)) or isinstance(value, bool):
+            publish(json.dumps(data))
+            return
+        # window summaries become RPM, RPM.min and RPM.max series
+        now = time.time()
+        batch.add(data["command"], now, value)
+        for key in ("min", "max"):
+            if key in data:
+                batch.add(f"{data['command']}.{key}", now, data[key])
+
+    def flush_uplink(force=False):
+        nonlocal batch_sent
+        if aggregator is not None:
+            aggregator.flush(force=force)
+        if batch is not None and batch.samples and (force or loop.time() - batch_sent >= UPLINK_BATCH):
+            batch_sent = loop.time()
+            for frame in batch.encode():
+                publish(frame)
+
+    aggregator = Aggregator(send_reading, AGGREGATE_WINDOWS, RAW_COMMANDS, RAW_KEEPALIVE) if AGGREGATE_WINDOWS else None
+
+    def send_value(name, value):
+        if aggregator is not None:
+            aggregator.add(name, value)
+        else:
+            send_reading({"command": name, "value": value})
+
+    def rule_changed(rule, active, value):
+        logger.warning("Rule %s %s at %s", rule.name, "fired" if active else "cleared", value)
+        publish(json.dumps({"command": "RULE", "value": {"rule": rule.name, "active": active, "value": value}}))
+        on_rule(rule.name, rule.mode, active)
+
+    rules = RulesEngine(RULES, rule_changed)
+
+    live = None
+    if LIVE_UPLINK:
+        host, port = LIVE_UPLINK
+        # the same host as the websocket shares its DNS cache (in a single process)
+        live = DatagramSender(host, port, resolver=connector.resolver if host == connector.host else None)
+        live_resolver = asyncio.create_task(live.keep_resolved())  # looked up (and retried) on the loop
+
+    def handle_value(name, value):
+        if live is not None and name in LIVE_COMMANDS and isinstance(value, (int, float)):
+            live.send(name, value)  # newest value right away; the websocket still gets the windows
+        send_value(name, value)
+        rules.add(name, value)
+
+    derived = DerivedEngine(DERIVED_CHANNELS, lambda name, value: handle_value(name, round(value, 3)))
+
+    is_parked = False
+
+    def set_parked(state):
+        nonlocal is_parked
+        if state != is_parked:
+            is_parked = state
+            if state:
+                rules.reset()
+            else:
+                derived.reset()  # a new ignition cycle starts a new trip
+            on_progress("parked" if state else "awake")
+            on_park(state)
+
+    attempts = 0
+    delay = RECONNECT_OBD_MIN
+    woke_at = None  # when the ignition (or the first attempt) started the clock for the first sample
     while True:  # Keep trying to connect forever
+        connection = None
         try:
-            print("Connecting to OBD-II...")
-            connection = obd.Async('/dev/rfcomm0', delay_cmds=0.25)
-            await asyncio.sleep(1)
-
-            if not connection.is_connected():
-                print(f"OBD-II connection failed. Retrying in {RECONNECT_OBD} seconds...")
-                await asyncio.sleep(RECONNECT_OBD)
+            if attempts and obd.metrics.enabled:
+                obd.metrics.count("reconnects")
+            attempts += 1
+            if woke_at is None:
+                woke_at = time.monotonic()
+            connection = await connect_obd(on_progress)
+
+            if connection is None:
+                # no adapter (out of Bluetooth range, unplugged...)
+                obd_logger.warning("OBD-II connection failed. Retrying in %s seconds...", delay)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RECONNECT_OBD_MAX)
+                woke_at = None
                 continue
 
-            print("Connected to OBD-II.")
+            if not connection.is_connected():
+                # parked: the adapter answers, the car doesn't. Keep the port open
+                # and sleep the adapter between voltage reads; once the ignition
+                # comes on, only the protocol search runs again, no ATZ
+                set_parked(True)
+                while not connection.is_connected():
+                    if not await sleep_while_parked(connection, publish):
+                        break
+                    await loop.run_in_executor(None, connection.connect_car)
+
+                if not connection.is_connected():
+                    # the adapter stopped answering: the link is gone, rebuild it
+                    obd_logger.warning("OBD-II adapter lost while parked. Retrying in %s seconds...", delay)
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, RECONNECT_OBD_MAX)
+                    woke_at = None
+                    continue
+                woke_at = time.monotonic()
+
+            delay = RECONNECT_OBD_MIN
+            set_parked(False)
 
             def create_callback(cmd):
                 def callback_func(response):
-                    if not response.is_null():
-                        value = response.value
-                        data = {
-                            "command": cmd.name,
-                            "value": getattr(value, "magnitude", str(value))
-                        }
-                        message = json.dumps(data)
-                        asyncio.run_coroutine_threadsafe(send_data(message), loop)
+                    nonlocal woke_at
+                    if response.is_null():
+                        return
+                    if cmd.mode is not None and not any(m.data for m in response.messages):
+                        # NO DATA, CAN ERROR...: the adapter's error lines decode to an
+                        # empty value (an empty DTC list), not a reading from the car
+                        return
+                    if woke_at is not None:
+                        elapsed = time.monotonic() - woke_at
+                        woke_at = None
+                        obd_logger.info("First OBD-II sample %.1f seconds after wake up", elapsed)
+                        if obd.metrics.enabled:
+                            obd.metrics.observe("time_to_first_sample", elapsed)
+                    value = response.value
+                    value = getattr(value, "magnitude", str(value))
+                    handle_value(cmd.name, value)
+                    derived.add(cmd.name, value)
 
                 return callback_func
 
@@ -65,46 +343,83 @@ async def obd_handler():
                 obd.commands.THROTTLE_POS, obd.commands.ENGINE_LOAD, obd.commands.MAF,
                 obd.commands.INTAKE_TEMP, obd.commands.ELM_VOLTAGE, obd.commands.GET_CURRENT_DTC
             ]
+            # the derived channels' sources are polled even when not listed above
+            commands += [obd.commands[name] for name in sorted(derived.inputs)
+                         if obd.commands.has_name(name) and obd.commands[name] not in commands]
 
             for cmd in commands:
                 connection.watch(cmd, callback=create_callback(cmd))
 
             connection.start()
 
-            try:
-                while True:
-                    await asyncio.sleep(1)
-            except asyncio.CancelledError:
-                connection.stop()
-                break
+            # the poller thread exits by itself when the adapter goes away
+            engine_off_since = None
+            watched_extra = set()
+            while connection.running:
+                await asyncio.sleep(1)
+                flush_uplink()  # ended windows of PIDs that stopped answering, due batches
+
+                # follow the server's watch/unwatch requests, without pausing the poller
+                requested = {name for name in extra_commands if watchable(name)} - {cmd.name for cmd in commands}
+                for name in requested - watched_extra:
+                    connection.watch(obd.commands[name], callback=create_callback(obd.commands[name]))
+                for name in watched_extra - requested:
+                    connection.unwatch(obd.commands[name])
+                watched_extra = requested
+
+                if engine_running(connection):
+                    engine_off_since = None
+                elif engine_off_since is None:
+                    engine_off_since = loop.time()
+                elif loop.time() - engine_off_since >= PARK_AFTER:
+                    flush_uplink(force=True)
+                    set_parked(True)
+                    if not await sleep_while_parked(connection, publish):
+                        break
+                    # same car, same protocol: just resume polling
+                    set_parked(False)
+                    woke_at = time.monotonic()
+                    engine_off_since = None
+                    connection.start()
+
+            # re-attach right away: either the car is still on, or we'll find it parked
+            flush_uplink(force=True)
+            on_progress("disconnected")
 
         except serial.serialutil.SerialException as e:
-            print(f"SerialException: {e}. Retrying in {RECONNECT_OBD} seconds...")
-            await asyncio.sleep(RECONNECT_OBD)
+            obd_logger.warning("SerialException: %s. Retrying in %s seconds...", e, delay)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RECONNECT_OBD_MAX)
 
         except Exception as e:
-            print(f"Unexpected error: {e}. Retrying in {RECONNECT_OBD} seconds...")
-            await asyncio.sleep(RECONNECT_OBD)
+            obd_logger.exception("Unexpected error: %s. Retrying in %s seconds...", e, delay)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RECONNECT_OBD_MAX)
+
         finally:
-            time.sleep(0.2)  # Keep CPU safe
+            if connection is not None:
+                await loop.run_in_executor(None, connection.close)
 
 
 def bind_rfcomm():
+    if not OBD_PORT.startswith("/dev/rfcomm"):
+        return  # rfcomm:// talks to the adapter over a socket, nothing to bind
+
     try:
         # Check if rfcomm0 is already bound
         result = subprocess.run(["rfcomm"], capture_output=True, text=True)
         if "/dev/rfcomm0" in result.stdout:
-            print("rfcomm0 already bound.")
+            obd_logger.info("rfcomm0 already bound.")
             return
 
         # Bind the device
         subprocess.run(
-            ["sudo", "rfcomm", "bind", "/dev/rfcomm0", "DD:0D:30:48:A4:9C"],
+            ["sudo", "rfcomm", "bind", "/dev/rfcomm0", OBD_ADAPTER_MAC],
             check=True
         )
-        print("rfcomm0 bound successfully.")
+        obd_logger.info("rfcomm0 bound successfully.")
     except Exception as e:
-        print(f"Failed to bind rfcomm: {e}")
+        obd_logger.error("Failed to bind rfcomm: %s", e)
 
 
 # === LED Functions ===
@@ -248,39 +563,154 @@ def run_mode():
             if RUN_MODE.get(current_mode):
                 RUN_MODE[current_mode]()
         except Exception as e:
-            print(f"[run_mode] Something went wrong: {e}")
+            led_logger.exception("Something went wrong: %s", e)
         finally:
             time.sleep(0.2)
 
 
+def set_mode(mode):
+    global current_mode, mode_before_park, mode_before_rules
+    if parked:
+        mode_before_park = mode
+        led_logger.info("Mode %s will be shown when the car wakes up", mode)
+        return
+    if active_rules:
+        mode_before_rules = mode
+        led_logger.info("Mode %s will be shown once the alerts clear", mode)
+        return
+    current_mode = mode
+    led_logger.info("Mode changed to: %s", current_mode)
+    clear_strip()
+
+
+def park_leds(state):
+    """ Blanks the strip while the car is parked, and brings the last mode back on wake """
+    global parked, mode_before_park
+    if state == parked:
+        return
+    if state:
+        mode_before_park = current_mode
+        set_mode("off")
+        parked = True
+    else:
+        parked = False
+        set_mode(mode_before_park)
+
+
+def show_rule(name, mode, active):
+    """ Overlays the mode of a firing local rule, and brings the previous mode back once none fire """
+    global current_mode, mode_before_rules
+    if parked:
+        return
+    if active:
+        if not active_rules:
+            mode_before_rules = current_mode
+        active_rules[name] = mode
+    elif active_rules.pop(name, None) is None:
+        return
+
+    current_mode = list(active_rules.values())[-1] if active_rules else mode_before_rules
+    led_logger.info("Mode changed to: %s", current_mode)
+    clear_strip()
+
+
+def watchable(name):
+    """ Only mode 01 PIDs (live data) may be polled on request: other modes have side effects, like 04 clearing the DTCs """
+    return obd.commands.has_name(name) and obd.commands[name].mode == 1
+
+
+def set_watch(message):
+    """ Handles "watch:<PID name>" and "unwatch:<PID name>" requests from the server """
+    action, _, name = message.partition(":")
+    name = name.strip().upper()
+    if not watchable(name):
+        obd_logger.warning("Not a live data PID, refused: %s", name)
+        return
+    if action == "watch":
+        extra_commands.add(name)
+    else:
+        extra_commands.discard(name)
+    obd_logger.info("Extra OBD commands: %s", sorted(extra_commands))
+
+
+def set_debug(message):
+    """ Handles "debug:on" and "debug:off" from the server, it turns itself off after logs.DEBUG_TIMEOUT """
+    logs.set_debug(message.partition(":")[2].strip() == "on")
+
+
 # === WebSocket Handler ===
-async def websocket_handler():
-    #global websocket, current_mode
+async def websocket_handler(on_mode=set_mode, on_watch=set_watch, on_debug=set_debug):
+    global websocket
+    try:
+        await connector.resolve()  # warm the DNS cache before the first connect
+    except OSError as e:
+        ws_logger.warning("WebSocket DNS lookup failed: %s", e)
+
     while True:
         try:
-            async with websockets.connect(WEBSOCKET_URL) as ws:
+            async with await connector.connect() as ws:
                 websocket = ws
-                print("Connected to WebSocket.")
-                
+                ws_logger.info("Connected to WebSocket (%d/%d TLS sessions resumed).",
+                               connector.resumed, connector.connects)
+
                 async for message in websocket:
-                    message = message.decode("utf-8")
-                    #print(f"Received: {message}")
+                    connector.remember_session(ws)  # the server's session ticket comes after the handshake
+                    if isinstance(message, bytes):
+                        message = message.decode("utf-8")
+                    ws_logger.debug("Received: %s", message)
                     if message in RUN_MODE.keys():
-                        current_mode = message
-                        print(f"Mode changed to: {current_mode}")
-                        clear_strip()
+                        on_mode(message)
+                    elif message.startswith(("watch:", "unwatch:")):
+                        on_watch(message)
+                    elif message.startswith("debug:"):
+                        on_debug(message)
         except Exception as e:
-            print(f"WebSocket error: {e}")
-            await asyncio.sleep(5)
+            ws_logger.warning("WebSocket error: %s", e)
+        finally:
+            websocket = None
+            connector.dropped()
+        await asyncio.sleep(connector.delay())
 
 
 async def send_data(message):
     if websocket:
         try:
+            start = obd.metrics.start() if obd.metrics.enabled else None
             await websocket.send(message)
-            print(f"Sent: {message}")
+            if start is not None:
+                obd.metrics.stop("send", start)
+            elapsed = connector.sent()
+            if elapsed is not None:
+                ws_logger.info("First message sent %.2f seconds after the WebSocket dropped", elapsed)
+                if obd.metrics.enabled:
+                    obd.metrics.observe("reconnect_to_first_send", elapsed)
+            if uplink_logger.isEnabledFor(logging.DEBUG):
+                uplink_logger.debug("Sent: %s", message if isinstance(message, str) else f"{len(message)} byte batch")
         except Exception as e:
-            print(f"Error sending data: {e}")
+            ws_logger.warning("Error sending data: %s", e)
+
+
+def metrics_frame(snapshot=None):
+    """ The METRICS frame; in supervisor mode, the OBD process' snapshot with this process' spans (send...) added """
+    value = obd.metrics.snapshot()
+    if snapshot is not None:
+        for key in ("counters", "gauges", "spans"):
+            value[key] = {**snapshot[key], **value[key]}
+        value["uptime"] = snapshot["uptime"]
+    return json.dumps({"command": "METRICS", "value": value})
+
+
+async def metrics_reporter(publish=None, is_parked=None):
+    """ Reports obd.metrics every METRICS_INTERVAL; with publish, hands the raw snapshot to the network process """
+    obd.metrics.enable()
+    while True:
+        await asyncio.sleep(METRICS_INTERVAL)
+        if parked if is_parked is None else is_parked():
+            continue  # only heartbeats while parked
+        if publish is None:
+            await send_data(metrics_frame())
+        else:
+            publish(obd.metrics.snapshot())
 
 
 # === Main Async Runner ===
@@ -288,16 +718,21 @@ async def main():
     led_thread = threading.Thread(target=run_mode, daemon=True)
     led_thread.start()
 
-    await asyncio.gather(
-        websocket_handler(),
-        obd_handler()
-    )
+    tasks = [websocket_handler(), obd_handler()]
+    if METRICS_INTERVAL:
+        tasks.append(metrics_reporter())
+
+    await asyncio.gather(*tasks)
 
 
 if __name__ == "__main__":
+    setup_logging()
     try:
+        init_strip()
         bind_rfcomm()
         asyncio.run(main())
     except KeyboardInterrupt:
-        print("Exiting...")
+        logger.info("Exiting...")
         clear_strip()
+    finally:
+        logs.stop()
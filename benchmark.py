@@ -0,0 +1,464 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import resource
+import time
+
+import obd
+import websockets
+from obd.instrumentation import percentile
+
+import codec
+import relay
+from demo import VehicleSimulator
+from emulator import ELM327Emulator
+
+# === Benchmark Configuration ===
+DEFAULT_TRANSCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "transcripts", "can11_drive.txt")
+DEFAULT_SAMPLES = 2000
+
+# adapter link profiles: (latency, jitter) added to every emulated response, in seconds
+PROFILES = {
+    "cpu": (0.0, 0.0),          # no link delay, measures our own processing only
+    "usb": (0.012, 0.004),      # wired ELM327
+    "bluetooth": (0.045, 0.02),  # Bluetooth ELM327 clone on /dev/rfcomm0
+}
+
+COMMANDS = [
+    obd.commands.RPM, obd.commands.SPEED, obd.commands.COOLANT_TEMP,
+    obd.commands.THROTTLE_POS, obd.commands.ENGINE_LOAD, obd.commands.MAF,
+    obd.commands.INTAKE_TEMP
+]
+
+STAGES = ["serial", "parse", "decode", "callback", "json", "send", "total"]
+
+# resolution of the decoded PIDs, so simulated values look like real ones
+RESOLUTION = {
+    "RPM": 0.25, "SPEED": 1, "COOLANT_TEMP": 1, "ENGINE_LOAD": 100 / 255,
+    "THROTTLE_POS": 100 / 255, "INTAKE_TEMP": 1, "ELM_VOLTAGE": 0.1, "MAF": 0.01,
+}
+POLL_INTERVAL = 0.25  # seconds between two samples of a PID
+BATCH_SECONDS = 10
+RELAY_VEHICLES = 50
+RELAY_DASHBOARDS = 4  # per vehicle
+RELAY_TIMEOUT = 30  # seconds to wait for the fan-out to drain
+RELAY_END = json.dumps({"command": "END"})  # last message of a run; the relay drops the oldest, never it
+
+
+# === Transcript corpus ===
+def load_transcript(path):
+    """
+        Reads an ELM327 response transcript.
+        Returns (protocol id, {request: [response lines, ...]})
+    """
+    protocol = "6"
+    responses = {}
+    block = []
+
+    with open(path) as f:
+        for line in f.read().splitlines() + [""]:
+            line = line.strip()
+            if line.startswith("#"):
+                if line[1:].split()[:1] == ["protocol"]:
+                    protocol = line.split()[-1]
+                continue
+            if line:
+                block.append(line)
+            elif block:
+                request = block[0].replace(" ", "").upper()
+                responses.setdefault(request, []).append(block[1:])
+                block = []
+
+    return protocol, responses
+
+
+class TranscriptEmulator(ELM327Emulator):
+    """ ELM327 emulator answering OBD requests with recorded responses, in order, looping """
+
+    def __init__(self, path, **kwargs):
+        protocol, self.transcript = load_transcript(path)
+        self.__positions = {}
+        super().__init__(protocol, **kwargs)
+
+    def obd_request(self, command):
+        if len(command) % 2:
+            command = command[:-1]
+        responses = self.transcript.get(command)
+        if not responses:
+            return ["NO DATA"]
+        position = self.__positions.get(command, 0)
+        self.__positions[command] = position + 1
+        return responses[position % len(responses)]
+
+
+# === Measurements ===
+class Stage:
+    def __init__(self, name):
+        self.name = name
+        self.durations = []
+
+    def add(self, duration):
+        self.durations.append(duration)
+
+    def percentile(self, p):
+        return percentile(sorted(self.durations), p)
+
+    def summary(self):
+        return {
+            "count": len(self.durations),
+            "p50_ms": self.percentile(50) * 1000,
+            "p99_ms": self.percentile(99) * 1000,
+        }
+
+
+def rss_kb():
+    """ Current resident set size, falling back to the peak where /proc isn't available """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class TimedProtocol:
+    """ Wraps the ELM327's protocol object to time Protocol.__call__ """
+
+    def __init__(self, protocol, stage):
+        self.protocol = protocol
+        self.stage = stage
+        self.last = 0.0
+
+    def __call__(self, lines):
+        start = time.perf_counter()
+        messages = self.protocol(lines)
+        self.last = time.perf_counter() - start
+        self.stage.add(self.last)
+        return messages
+
+    def __getattr__(self, name):
+        return getattr(self.protocol, name)
+
+
+def timed_command(cmd, stage):
+    cmd = cmd.clone()
+    decode = cmd.decode
+
+    def timed_decode(messages):
+        start = time.perf_counter()
+        value = decode(messages)
+        stage.add(time.perf_counter() - start)
+        return value
+
+    cmd.decode = timed_decode
+    return cmd
+
+
+# === Local websocket sink ===
+class Sink:
+    def __init__(self):
+        self.received = 0
+        self.server = None
+
+    async def handler(self, ws):
+        async for _ in ws:
+            self.received += 1
+
+    async def start(self):
+        self.server = await websockets.serve(self.handler, "127.0.0.1", 0)
+        port = self.server.sockets[0].getsockname()[1]
+        return f"ws://127.0.0.1:{port}"
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+
+# === Pipeline ===
+async def run_benchmark(transcript, samples, profile, port=None):
+    latency, jitter = PROFILES[profile]
+    stages = {name: Stage(name) for name in STAGES}
+    loop = asyncio.get_running_loop()
+
+    sink = Sink()
+    url = await sink.start()
+    ws = await websockets.connect(url)
+
+    emulator = None
+    if port is None:
+        emulator = TranscriptEmulator(transcript, latency=latency, jitter=jitter).start()
+        port = emulator.port_name
+
+    connection = await loop.run_in_executor(None, obd.OBD, port)
+    if not connection.is_connected():
+        if emulator is not None:
+            emulator.close()
+        raise RuntimeError(f"Could not connect to the adapter on {port}")
+
+    interface = connection.interface
+    protocol = TimedProtocol(interface._ELM327__protocol, stages["parse"])
+    interface._ELM327__protocol = protocol
+
+    send_and_parse = interface.send_and_parse
+
+    def timed_send_and_parse(cmd):
+        start = time.perf_counter()
+        messages = send_and_parse(cmd)
+        stages["serial"].add(time.perf_counter() - start - protocol.last)
+        return messages
+
+    interface.send_and_parse = timed_send_and_parse
+
+    commands = [timed_command(cmd, stages["decode"]) for cmd in COMMANDS]
+    pending = []
+
+    async def send(message, started):
+        start = time.perf_counter()
+        await ws.send(message)
+        now = time.perf_counter()
+        stages["send"].add(now - start)
+        stages["total"].add(now - started)
+
+    def callback(cmd, response, started):
+        start = time.perf_counter()
+        if response.is_null():
+            return
+        value = response.value
+        data = {
+            "command": cmd.name,
+            "value": getattr(value, "magnitude", str(value))
+        }
+        json_start = time.perf_counter()
+        message = json.dumps(data)
+        json_end = time.perf_counter()
+        stages["json"].add(json_end - json_start)
+        pending.append(asyncio.run_coroutine_threadsafe(send(message, started), loop))
+        stages["callback"].add(time.perf_counter() - start - (json_end - json_start))
+
+    def poll():
+        for i in range(samples):
+            cmd = commands[i % len(commands)]
+            started = time.perf_counter()
+            response = connection.query(cmd, force=True)
+            callback(cmd, response, started)
+
+    # CPU time is for the whole process, so it includes the emulated adapter's thread
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    await loop.run_in_executor(None, poll)
+    for future in pending:
+        await asyncio.wrap_future(future)
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+
+    connection.close()
+    if emulator is not None:
+        emulator.close()
+    await ws.close()
+    await sink.stop()
+
+    return {
+        "transcript": os.path.basename(transcript) if emulator is not None else port,
+        "profile": profile,
+        "samples": samples,
+        "delivered": sink.received,
+        "samples_per_s": sink.received / wall if wall else 0.0,
+        "cpu_percent": 100.0 * cpu / wall if wall else 0.0,
+        "rss_kb": rss_kb(),
+        "stages": {name: stage.summary() for name, stage in stages.items()},
+    }
+
+
+# === Uplink encoding ===
+def run_codec_benchmark(samples):
+    """ Bytes per sample of the uplink encodings, on simulated drive data """
+    simulator = VehicleSimulator()
+    batches = []
+    batch = {}
+    now = time.time()
+    start = now
+    for _ in range(samples // len(RESOLUTION)):
+        now += POLL_INTERVAL + random.uniform(-0.01, 0.01)  # serial timing jitter
+        for name, value in simulator.generate_data().items():
+            value = round(value / RESOLUTION[name]) * RESOLUTION[name]
+            timestamps, values = batch.setdefault(name, ([], []))
+            timestamps.append(int(now * 1000))
+            values.append(value)
+        if now - start >= BATCH_SECONDS:
+            batches.append(batch)
+            batch, start = {}, now
+    if batch:
+        batches.append(batch)
+
+    count = sum(len(t) for b in batches for t, _ in b.values())
+    sizes = {"json_per_sample": 0, "json_batch": 0, "codec": 0}
+    encode_time = decode_time = 0.0
+    for b in batches:
+        for name, (timestamps, values) in b.items():
+            for t, v in zip(timestamps, values):
+                sizes["json_per_sample"] += len(json.dumps({"command": name, "value": v}))
+        sizes["json_batch"] += len(json.dumps({name: list(zip(*series)) for name, series in b.items()}))
+
+        started = time.perf_counter()
+        data = codec.encode_batch(b)
+        encode_time += time.perf_counter() - started
+        sizes["codec"] += len(data)
+
+        started = time.perf_counter()
+        decoded = codec.decode_batch(data)
+        decode_time += time.perf_counter() - started
+        assert decoded == {name: (t, [float(x) for x in v]) for name, (t, v) in b.items()}
+
+    return {
+        "samples": count,
+        "batches": len(batches),
+        "bytes_per_sample": {name: size / count for name, size in sizes.items()},
+        "encode_us_per_sample": encode_time / count * 1e6,
+        "decode_us_per_sample": decode_time / count * 1e6,
+    }
+
+
+# === Relay ===
+def relay_process(ports):
+    asyncio.run(relay.serve("127.0.0.1", 0, report_interval=0, on_ready=ports.put))
+
+
+def process_cpu_seconds(pid):
+    """ user + system CPU time of another process, from /proc """
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+async def drive_relay(port, pid, vehicles, dashboards, messages):
+    url = f"ws://127.0.0.1:{port}"
+    simulator = VehicleSimulator()
+    payloads = [json.dumps({"command": name.upper(), "value": value})
+                for _ in range(messages // len(RESOLUTION) + 1)
+                for name, value in simulator.generate_data().items()][:messages]
+
+    cpu_start = process_cpu_seconds(pid)
+    started = time.perf_counter()
+    dashboard_ws = await asyncio.gather(*[websockets.connect(f"{url}/dashboard/{v}")
+                                          for v in range(vehicles) for _ in range(dashboards)])
+    vehicle_ws = await asyncio.gather(*[websockets.connect(f"{url}/vehicle/{v}") for v in range(vehicles)])
+    connect_time = time.perf_counter() - started
+    connect_cpu = process_cpu_seconds(pid) - cpu_start
+
+    received = [0] * len(dashboard_ws)
+
+    async def read(i, ws):
+        async for message in ws:
+            if message == RELAY_END:
+                return
+            received[i] += 1
+
+    async def send(ws):
+        for payload in payloads:
+            await ws.send(payload)
+        await ws.send(RELAY_END)
+
+    cpu_start = process_cpu_seconds(pid)
+    started = time.perf_counter()
+    readers = asyncio.gather(*[read(i, ws) for i, ws in enumerate(dashboard_ws)])
+    await asyncio.gather(*[send(ws) for ws in vehicle_ws])
+    try:
+        await asyncio.wait_for(readers, RELAY_TIMEOUT)
+    except asyncio.TimeoutError:
+        pass
+    wall = time.perf_counter() - started
+    cpu = process_cpu_seconds(pid) - cpu_start
+
+    for ws in vehicle_ws + dashboard_ws:
+        await ws.close()
+
+    delivered = sum(received)
+    return {
+        "vehicles": vehicles,
+        "dashboards": len(dashboard_ws),
+        "messages": vehicles * len(payloads),
+        "delivered": delivered,
+        "expected": len(dashboard_ws) * len(payloads),
+        "connections_per_s": (vehicles + len(dashboard_ws)) / connect_time,
+        "connections_per_cpu_s": (vehicles + len(dashboard_ws)) / connect_cpu if connect_cpu else None,
+        "messages_in_per_s": vehicles * len(payloads) / wall,
+        "deliveries_per_s": delivered / wall,
+        "deliveries_per_cpu_s": delivered / cpu if cpu else None,
+        "relay_cpu_percent": 100.0 * cpu / wall,
+    }
+
+
+def run_relay_benchmark(vehicles, dashboards, messages):
+    """ Relay throughput; the relay runs in its own process (one core), the clients in this one """
+    ports = multiprocessing.Queue()
+    process = multiprocessing.Process(target=relay_process, args=(ports,), daemon=True)
+    process.start()
+    try:
+        port = ports.get(timeout=10)
+        return asyncio.run(drive_relay(port, process.pid, vehicles, dashboards, messages))
+    finally:
+        process.terminate()
+        process.join()
+
+
+def print_relay_report(result):
+    print(f"{result['vehicles']} vehicles, {result['dashboards']} dashboards, "
+          f"{result['messages']} messages in, {result['delivered']}/{result['expected']} delivered")
+    print(f"connections: {result['connections_per_s']:.0f}/s, "
+          f"{result['connections_per_cpu_s'] or 0:.0f} per relay CPU second")
+    print(f"messages in: {result['messages_in_per_s']:.0f}/s, deliveries out: {result['deliveries_per_s']:.0f}/s, "
+          f"{result['deliveries_per_cpu_s'] or 0:.0f} per relay CPU second (relay CPU {result['relay_cpu_percent']:.0f}%)")
+    print("the clients share this process; undelivered messages were dropped by full dashboard queues, "
+          "at 100% relay CPU the relay is the bottleneck")
+
+
+def print_codec_report(result):
+    print(f"{result['samples']} samples in {result['batches']} batches of {BATCH_SECONDS} seconds")
+    for name, size in result["bytes_per_sample"].items():
+        print(f"{name:<16}{size:>8.2f} bytes/sample")
+    print(f"codec: encode {result['encode_us_per_sample']:.1f} us/sample, "
+          f"decode {result['decode_us_per_sample']:.1f} us/sample")
+
+
+def print_report(result):
+    print(f"Transcript: {result['transcript']}  profile: {result['profile']}")
+    print(f"Delivered {result['delivered']}/{result['samples']} samples, "
+          f"{result['samples_per_s']:.1f} samples/s, CPU {result['cpu_percent']:.1f}%, "
+          f"RSS {result['rss_kb'] / 1024:.1f} MB")
+    print(f"{'stage':<10}{'count':>8}{'p50 ms':>10}{'p99 ms':>10}")
+    for name, stage in result["stages"].items():
+        print(f"{name:<10}{stage['count']:>8}{stage['p50_ms']:>10.3f}{stage['p99_ms']:>10.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Telemetry pipeline benchmark")
+    parser.add_argument("--transcript", default=DEFAULT_TRANSCRIPT, help="ELM327 response transcript to replay")
+    parser.add_argument("--samples", type=int, default=DEFAULT_SAMPLES)
+    parser.add_argument("--profile", default="cpu", choices=sorted(PROFILES))
+    parser.add_argument("--port", help="connect to this port instead, e.g. replay://drive.obdlog?speed=0&loop=1")
+    parser.add_argument("--codec", action="store_true", help="compare the uplink encodings instead")
+    parser.add_argument("--relay", action="store_true", help="measure the relay server's fan-out instead")
+    parser.add_argument("--vehicles", type=int, default=RELAY_VEHICLES, help="relay benchmark vehicles")
+    parser.add_argument("--dashboards", type=int, default=RELAY_DASHBOARDS, help="relay benchmark dashboards per vehicle")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    if args.codec:
+        result = run_codec_benchmark(args.samples)
+        report = print_codec_report
+    elif args.relay:
+        result = run_relay_benchmark(args.vehicles, args.dashboards, args.samples)
+        report = print_relay_report
+    else:
+        result = asyncio.run(run_benchmark(args.transcript, args.samples, args.profile, args.port))
+        report = print_report
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        report(result)
+
+
+if __name__ == "__main__":
+    main()
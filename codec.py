@@ -0,0 +1,273 @@
+"""
+Compact time series encoding for uplink batches, after Facebook's Gorilla:
+- timestamps (integer milliseconds) as delta-of-deltas, which are 0 for a
+  steady polling rate and stay small with jitter
+- float values XOR'ed with the previous one, keeping only the meaningful
+  bits, since most PIDs change slowly or not at all between two samples
+Everything is bit-packed; decode_batch() is the matching pure-Python decoder
+for the server side.
+
+Batch layout: MAGIC, series count (varint), then per series its name
+(varint length + UTF-8), sample count (varint), payload length (varint)
+and the bit-packed payload.
+"""
+import struct
+import threading
+
+MAGIC = b"GZ1"
+
+# delta-of-delta buckets, in ms: (control bits, control bit count, value bits)
+# '0' alone means the same delta as before
+DOD_BUCKETS = [
+    (0b10, 2, 7),
+    (0b110, 3, 9),
+    (0b1110, 4, 12),
+    (0b1111, 4, 32),
+]
+
+
+def dod_fits(dod):
+    """ whether a delta-of-delta fits the widest bucket, e.g. not after the clock was set """
+    bound = 1 << (DOD_BUCKETS[-1][2] - 1)
+    return -bound < dod <= bound
+
+
+# === Bit streams ===
+class BitWriter:
+    def __init__(self):
+        self.data = bytearray()
+        self.__bits = 0  # pending bits, MSB first
+        self.__count = 0
+
+    def write(self, value, bits):
+        self.__bits = (self.__bits << bits) | (value & ((1 << bits) - 1))
+        self.__count += bits
+        while self.__count >= 8:
+            self.__count -= 8
+            self.data.append((self.__bits >> self.__count) & 0xFF)
+        self.__bits &= (1 << self.__count) - 1
+
+    def getvalue(self):
+        if self.__count:
+            return bytes(self.data) + bytes([(self.__bits << (8 - self.__count)) & 0xFF])
+        return bytes(self.data)
+
+
+class BitReader:
+    def __init__(self, data):
+        self.data = data
+        self.position = 0  # in bits
+
+    def read(self, bits):
+        value = 0
+        for _ in range(bits):
+            byte = self.data[self.position >> 3]
+            value = (value << 1) | ((byte >> (7 - (self.position & 7))) & 1)
+            self.position += 1
+        return value
+
+
+def _float_bits(value):
+    return struct.unpack(">Q", struct.pack(">d", value))[0]
+
+
+def _bits_float(bits):
+    return struct.unpack(">d", struct.pack(">Q", bits))[0]
+
+
+def _leading_zeros(x):
+    return 64 - x.bit_length()
+
+
+def _trailing_zeros(x):
+    return (x & -x).bit_length() - 1
+
+
+# === Series ===
+def encode_series(timestamps, values):
+    """
+        Bit-packs one PID's samples; timestamps are integer milliseconds.
+        Raises ValueError when a delta-of-delta doesn't fit in 32 bits (see dod_fits).
+    """
+    w = BitWriter()
+    previous_time = previous_delta = 0
+    previous_bits = 0
+    leading = trailing = None  # the current meaningful bits window
+
+    for i, (t, value) in enumerate(zip(timestamps, values)):
+        bits = _float_bits(float(value))
+        if i == 0:
+            w.write(t, 64)
+            w.write(bits, 64)
+            previous_time, previous_bits = t, bits
+            continue
+
+        # timestamp: delta-of-delta
+        delta = t - previous_time
+        dod = delta - previous_delta
+        if dod == 0:
+            w.write(0, 1)
+        else:
+            if not dod_fits(dod):
+                raise ValueError(f"Delta-of-delta of {dod} ms at sample {i} doesn't fit in 32 bits")
+            for control, control_bits, value_bits in DOD_BUCKETS:
+                if -(1 << (value_bits - 1)) < dod <= (1 << (value_bits - 1)):
+                    w.write(control, control_bits)
+                    w.write(dod, value_bits)
+                    break
+        previous_time, previous_delta = t, delta
+
+        # value: XOR with the previous one
+        xor = bits ^ previous_bits
+        previous_bits = bits
+        if xor == 0:
+            w.write(0, 1)
+            continue
+        w.write(1, 1)
+        lz = min(_leading_zeros(xor), 31)  # stored in 5 bits
+        tz = _trailing_zeros(xor)
+        if leading is not None and lz >= leading and tz >= trailing:
+            # fits in the previous window, don't repeat its size
+            w.write(0, 1)
+            w.write(xor >> trailing, 64 - leading - trailing)
+        else:
+            leading, trailing = lz, tz
+            meaningful = 64 - lz - tz
+            w.write(1, 1)
+            w.write(lz, 5)
+            w.write(meaningful - 1, 6)  # 1..64 stored as 0..63
+            w.write(xor >> tz, meaningful)
+
+    return w.getvalue()
+
+
+def _signed(value, bits):
+    return value - (1 << bits) if value > (1 << (bits - 1)) else value
+
+
+def decode_series(data, count):
+    """ Returns (timestamps, values) lists from encode_series() output """
+    r = BitReader(data)
+    timestamps, values = [], []
+    if count == 0:
+        return timestamps, values
+
+    t = r.read(64)
+    bits = r.read(64)
+    timestamps.append(t)
+    values.append(_bits_float(bits))
+    delta = 0
+    leading = trailing = 0
+
+    for _ in range(count - 1):
+        # timestamp
+        dod = 0
+        if r.read(1) == 1:
+            # one more 1 bit per wider bucket, the widest has no terminating 0
+            bucket = 0
+            while bucket < len(DOD_BUCKETS) - 1 and r.read(1) == 1:
+                bucket += 1
+            value_bits = DOD_BUCKETS[bucket][2]
+            dod = _signed(r.read(value_bits), value_bits)
+        delta += dod
+        t += delta
+        timestamps.append(t)
+
+        # value
+        if r.read(1) == 1:
+            if r.read(1) == 1:
+                leading = r.read(5)
+                meaningful = r.read(6) + 1
+                trailing = 64 - leading - meaningful
+            bits ^= r.read(64 - leading - trailing) << trailing
+        values.append(_bits_float(bits))
+
+    return timestamps, values
+
+
+# === Batches ===
+def _write_varint(out, n):
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _read_varint(data, i):
+    n = shift = 0
+    while True:
+        byte = data[i]
+        i += 1
+        n |= (byte & 0x7F) << shift
+        shift += 7
+        if byte < 0x80:
+            return n, i
+
+
+def encode_batch(series):
+    """ series: {name: (timestamps in ms, values)} -> bytes """
+    out = bytearray(MAGIC)
+    _write_varint(out, len(series))
+    for name, (timestamps, values) in series.items():
+        encoded_name = name.encode("utf-8")
+        payload = encode_series(timestamps, values)
+        _write_varint(out, len(encoded_name))
+        out += encoded_name
+        _write_varint(out, len(timestamps))
+        _write_varint(out, len(payload))
+        out += payload
+    return bytes(out)
+
+
+def decode_batch(data):
+    """ bytes -> {name: (timestamps in ms, values)} """
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError("Not a time series batch")
+    i = len(MAGIC)
+    count, i = _read_varint(data, i)
+    series = {}
+    for _ in range(count):
+        length, i = _read_varint(data, i)
+        name = data[i:i + length].decode("utf-8")
+        i += length
+        samples, i = _read_varint(data, i)
+        length, i = _read_varint(data, i)
+        series[name] = decode_series(data[i:i + length], samples)
+        i += length
+    return series
+
+
+class Batch:
+    """
+        Collects samples per PID until the next encode(), which may run on another thread.
+        A sample whose timestamp can't be encoded after the previous ones (the
+        clock was set, e.g. by NTP after boot) starts a new block instead.
+    """
+
+    def __init__(self):
+        self.series = {}
+        self.samples = 0
+        self.__sealed = []  # earlier blocks of series, cut at clock jumps
+        self.__lock = threading.Lock()
+
+    def add(self, name, timestamp, value):
+        t = int(timestamp * 1000)
+        with self.__lock:
+            timestamps = self.series.get(name, ((),))[0]
+            if timestamps:
+                previous_delta = timestamps[-1] - timestamps[-2] if len(timestamps) > 1 else 0
+                if not dod_fits(t - timestamps[-1] - previous_delta):
+                    self.__sealed.append(self.series)
+                    self.series = {}
+            timestamps, values = self.series.setdefault(name, ([], []))
+            timestamps.append(t)
+            values.append(float(value))
+            self.samples += 1
+
+    def encode(self):
+        """ Returns the encoded batches: one, or more if the clock jumped since the last encode() """
+        with self.__lock:
+            blocks = self.__sealed + [self.series]
+            self.__sealed, self.series = [], {}
+            self.samples = 0
+        return [encode_batch(series) for series in blocks if series]
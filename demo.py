@@ -13,7 +13,7 @@ class VehicleSimulator:
         self.engine_load = 10
         self.throttle_pos = 0
         self.intake_temp = 25
-        self.elm_voltage = 12.5
+        self.elm_voltage = 14.1  # alternator charging, the engine is running
         self.maf = 2.0
 
     def generate_data(self):
@@ -48,7 +48,7 @@ class VehicleSimulator:
 
         # Simulate ELM voltage fluctuation
         self.elm_voltage += random.uniform(-0.05, 0.05)
-        self.elm_voltage = max(11.5, min(14.5, self.elm_voltage))
+        self.elm_voltage = max(13.5, min(14.5, self.elm_voltage))
 
         # Simulate Mass Air Flow (MAF) in grams/sec
         self.maf = (self.rpm * self.engine_load) / 12000 + random.uniform(-1, 1)
@@ -81,4 +81,5 @@ async def connect_to_obd():
             await asyncio.sleep(0.5)
 
 
-asyncio.run(connect_to_obd())
+if __name__ == "__main__":
+    asyncio.run(connect_to_obd())
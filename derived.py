@@ -0,0 +1,92 @@
+import time
+
+# === Derived Channels Configuration ===
+MAX_GAP = 5.0  # seconds without input after which integrals don't bridge the gap (parked, reconnecting)
+
+
+# === Channels ===
+class Derived:
+    """ A channel computed from the latest values of other channels, e.g. fuel rate from MAF """
+
+    def __init__(self, name, inputs, compute):
+        self.name = name
+        self.inputs = inputs
+        self.compute = compute  # called with the inputs' values, in order; None means no value
+
+    def update(self, values, now):
+        return self.compute(*[values[name] for name in self.inputs])
+
+
+class Integral(Derived):
+    """
+        A running total of a rate computed from other channels, e.g. distance from
+        SPEED. Integrated over time with the trapezoid rule, since samples don't
+        arrive at a fixed rate; `per` is the rate's time unit in seconds (3600 for km/h).
+    """
+
+    def __init__(self, name, inputs, rate, per=1.0):
+        super().__init__(name, inputs, rate)
+        self.per = per
+        self.total = 0.0
+        self.__last = None  # (time, rate)
+
+    def update(self, values, now):
+        rate = super().update(values, now)
+        if rate is None:
+            return None
+
+        if self.__last is not None:
+            last_time, last_rate = self.__last
+            dt = now - last_time
+            if 0 < dt <= MAX_GAP:
+                self.total += (last_rate + rate) / 2 * dt / self.per
+        self.__last = (now, rate)
+        return self.total
+
+    def reset(self):
+        self.total = 0.0
+        self.__last = None
+
+
+# === Engine ===
+class DerivedEngine:
+    """
+        Evaluates derived channels incrementally: every sample updates the
+        channels that depend on it, and their new values are emitted like
+        any other command (and fed on, so channels can build on each other).
+    """
+
+    def __init__(self, channels, emit):
+        self.channels = channels
+        self.emit = emit  # called with (name, value)
+        self.values = {}  # latest value of every input and derived channel
+        self.__dependents = {}  # input name: channels computed from it
+        for channel in channels:
+            for name in channel.inputs:
+                self.__dependents.setdefault(name, []).append(channel)
+
+    @property
+    def inputs(self):
+        """ names of the channels the engine needs samples of, not counting its own channels """
+        return set(self.__dependents) - {channel.name for channel in self.channels}
+
+    def add(self, name, value, timestamp=None):
+        if not isinstance(value, (int, float)) or isinstance(value, bool):
+            return
+        self.values[name] = value
+
+        now = time.monotonic() if timestamp is None else timestamp
+        for channel in self.__dependents.get(name, ()):
+            if any(self.values.get(i) is None for i in channel.inputs):
+                continue
+            result = channel.update(self.values, now)
+            if result is not None:
+                self.emit(channel.name, result)
+                self.add(channel.name, result, now)
+
+    def reset(self):
+        """ Starts a new trip: clears the latest values and the running totals """
+        self.values = {}
+        for channel in self.channels:
+            if isinstance(channel, Integral):
+                channel.reset()
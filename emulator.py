@@ -0,0 +1,544 @@
+import argparse
+import os
+import random
+import select
+import socket
+import struct
+import threading
+import time
+import tty
+
+from demo import VehicleSimulator
+
+# === Emulator Configuration ===
+ELM_VERSION = "ELM327 v1.5"
+UPDATE_INTERVAL = 0.1  # seconds between simulator steps
+DEFAULT_DTCS = []
+DEFAULT_VIN = "WVWZZZ1KZAW386759"
+RESTING_VOLTAGE = 12.4  # battery voltage with the ignition off
+
+# protocol id: (ELM name, CAN id bits)
+PROTOCOLS = {
+    "6": ("ISO 15765-4 (CAN 11/500)", 11),
+    "7": ("ISO 15765-4 (CAN 29/500)", 29),
+    "8": ("ISO 15765-4 (CAN 11/250)", 11),
+    "9": ("ISO 15765-4 (CAN 29/250)", 29),
+}
+
+# ECU: (11-bit request id, 11-bit response id, 29-bit ECU address)
+ECUS = {
+    "engine": (0x7E0, 0x7E8, 0x10),
+    "transmission": (0x7E1, 0x7E9, 0x18),
+}
+FUNCTIONAL_HEADERS = ("7DF", "DB33F1")
+
+INJECTED_ERRORS = ("NO DATA", "CAN ERROR", "STOPPED", "DROP")
+
+
+def _clamp(value, low, high):
+    return max(low, min(high, int(round(value))))
+
+
+def _word(value):
+    value = _clamp(value, 0, 0xFFFF)
+    return [value >> 8, value & 0xFF]
+
+
+def _percent(value):
+    return [_clamp(value * 255 / 100, 0, 255)]
+
+
+def _temperature(value):
+    return [_clamp(value + 40, 0, 255)]
+
+
+# Mode 01 PIDs: pid -> (simulator key, encoder)
+MODE_01 = {
+    0x04: ("ENGINE_LOAD", _percent),
+    0x05: ("COOLANT_TEMP", _temperature),
+    0x0C: ("RPM", lambda v: _word(v * 4)),
+    0x0D: ("SPEED", lambda v: [_clamp(v, 0, 255)]),
+    0x0F: ("INTAKE_TEMP", _temperature),
+    0x10: ("MAF", lambda v: _word(v * 100)),
+    0x11: ("THROTTLE_POS", _percent),
+}
+
+
+def _pid_bitmap(pids, base):
+    """ Supported-PID bit field for the PID listing command at `base` """
+    bits = 0
+    for pid in pids:
+        if base < pid <= base + 0x20:
+            bits |= 1 << (base + 0x20 - pid)
+    if any(pid > base + 0x20 for pid in pids):
+        bits |= 1  # the next listing command is supported
+    return list(bits.to_bytes(4, "big"))
+
+
+def _encode_dtc(code):
+    """ 'P0133' -> [0x01, 0x33] """
+    system = "PCBU".index(code[0].upper())
+    value = (system << 14) | int(code[1:], 16)
+    return [value >> 8, value & 0xFF]
+
+
+def isotp_frames(payload):
+    """ Splits a response payload into ISO-TP frames (PCI byte(s) + data) """
+    if len(payload) <= 7:
+        return [[len(payload)] + payload]
+
+    frames = [[0x10 | (len(payload) >> 8), len(payload) & 0xFF] + payload[:6]]
+    remaining = payload[6:]
+    seq = 1
+    while remaining:
+        frames.append([0x20 | (seq & 0x0F)] + remaining[:7])
+        remaining = remaining[7:]
+        seq += 1
+    return frames
+
+
+class Vehicle:
+    """ The simulated car: its ECUs, and what they answer to OBD requests """
+
+    def __init__(self, simulator=None, transmission=False, dtcs=None, vin=DEFAULT_VIN):
+        self.simulator = simulator or VehicleSimulator()
+        self.ecus = ["engine", "transmission"] if transmission else ["engine"]
+        self.dtcs = list(DEFAULT_DTCS if dtcs is None else dtcs)
+        self.vin = vin
+        self.__values = {}
+        self.__updated = 0.0
+
+    def payload(self, ecu, request):
+        """ Response payload of one ECU to a request, or None if it stays silent """
+        mode = request[0]
+        pid = request[1] if len(request) > 1 else None
+
+        if mode in (0x03, 0x07):
+            if ecu != "engine":
+                return None
+            data = [mode + 0x40, len(self.dtcs)]
+            for code in self.dtcs:
+                data += _encode_dtc(code)
+            return data
+
+        if mode == 0x01:
+            pids = MODE_01 if ecu == "engine" else {}
+            supported = list(pids) + [0x01] if ecu == "engine" else []
+            if pid in (0x00, 0x20, 0x40):
+                return [0x41, pid] + _pid_bitmap(supported, pid)
+            if pid == 0x01 and ecu == "engine":
+                mil = 0x80 if self.dtcs else 0x00
+                return [0x41, 0x01, mil | len(self.dtcs), 0x07, 0xE5, 0x00]
+            if pid in pids:
+                key, encode = pids[pid]
+                return [0x41, pid] + encode(self.sample(key))
+            return None
+
+        if mode == 0x09 and ecu == "engine":
+            if pid == 0x00:
+                return [0x49, 0x00] + _pid_bitmap([0x02], 0x00)
+            if pid == 0x02:
+                return [0x49, 0x02, 0x01] + list(self.vin.encode("ascii"))
+
+        return None
+
+    def sample(self, key):
+        now = time.monotonic()
+        if now - self.__updated >= UPDATE_INTERVAL or not self.__values:
+            self.__values = self.simulator.generate_data()
+            self.__updated = now
+        return self.__values[key]
+
+
+class ELM327Emulator:
+    """
+        Emulates an ELM327 adapter on a pseudo terminal, so obd.OBD(emulator.port_name)
+        talks to a simulated car. Values come from a VehicleSimulator, and the
+        adapter speaks enough of the AT command set for python-OBD's setup.
+    """
+
+    def __init__(self, protocol="6", simulator=None, latency=0.0, jitter=0.0,
+                 error_rate=0.0, transmission=False, dtcs=None, vin=DEFAULT_VIN, vehicle=None,
+                 ignition=True):
+        if protocol not in PROTOCOLS:
+            raise ValueError(f"Unsupported protocol {protocol}, use one of {', '.join(PROTOCOLS)}")
+
+        self.protocol = protocol
+        self.vehicle = vehicle or Vehicle(simulator, transmission, dtcs, vin)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.ignition = ignition  # with the ignition off, the ECUs don't answer
+        self.requests = 0
+        self.errors_injected = 0
+
+        self.__master, self.__slave = os.openpty()
+        tty.setraw(self.__slave)
+        self.port_name = os.ttyname(self.__slave)
+
+        self.__running = False
+        self.__thread = None
+        self.reset()
+
+    # === Lifecycle ===
+    def start(self):
+        if self.__thread is None:
+            self.__running = True
+            self.__thread = threading.Thread(target=self.run, daemon=True)
+            self.__thread.start()
+        return self
+
+    def stop(self):
+        self.__running = False
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+
+    def close(self):
+        self.stop()
+        os.close(self.__master)
+        os.close(self.__slave)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def reset(self):
+        self.echo = True
+        self.headers = False
+        self.spaces = True
+        self.linefeeds = False
+        self.selected_protocol = "0"  # automatic
+        self.header = FUNCTIONAL_HEADERS[0] if self.id_bits == 11 else FUNCTIONAL_HEADERS[1]
+        self.low_power = False
+        self.__last_command = ""
+
+    @property
+    def id_bits(self):
+        return PROTOCOLS[self.protocol][1]
+
+    # === Serial loop ===
+    def run(self):
+        buffer = b""
+        while self.__running:
+            ready, _, _ = select.select([self.__master], [], [], 0.1)
+            if not ready:
+                continue
+            try:
+                data = os.read(self.__master, 1024)
+            except OSError:
+                break
+
+            buffer += data
+            while b"\r" in buffer:
+                line, buffer = buffer.split(b"\r", 1)
+                self.__handle(line.decode("ascii", "ignore"))
+
+    def __handle(self, line):
+        if self.low_power:
+            # any character wakes the chip back up, with a warm start
+            self.low_power = False
+            self.__write(("\r" + ELM_VERSION + "\r\r>").encode("ascii"))
+            return
+
+        output = line + "\r" if self.echo else ""
+        lines = self.respond(line)
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+        eol = "\r\n" if self.linefeeds else "\r"
+        output += eol.join(lines) + eol + eol + ">"
+        self.__write(output.encode("ascii"))
+
+    def __write(self, data):
+        try:
+            os.write(self.__master, data)
+        except OSError:
+            self.__running = False
+
+    # === Command handling ===
+    def respond(self, line):
+        """ Returns the list of lines the adapter answers with """
+        command = line.replace(" ", "").upper()
+
+        if not command:
+            command = self.__last_command  # a bare CR repeats the last command
+        if not command:
+            return ["?"]
+        self.__last_command = command
+
+        if command.startswith("AT"):
+            return self.at_command(command[2:])
+        if all(c in "0123456789ABCDEF" for c in command):
+            self.requests += 1
+            return self.obd_request(command)
+        return ["?"]
+
+    def at_command(self, at):
+        if at == "Z":
+            self.reset()
+            return ["", ELM_VERSION]
+        if at == "I":
+            return [ELM_VERSION]
+        if at == "@1":
+            return ["OBDII to RS232 Interpreter"]
+        if at == "RV":
+            if not self.ignition:
+                return ["%.1fV" % RESTING_VOLTAGE]
+            return ["%.1fV" % self.vehicle.sample("ELM_VOLTAGE")]
+        if at == "DP":
+            name = PROTOCOLS[self.protocol][0]
+            return ["AUTO, " + name if self.selected_protocol == "0" else name]
+        if at == "DPN":
+            return ["A" + self.protocol if self.selected_protocol == "0" else self.selected_protocol]
+        if at == "LP":
+            self.low_power = True
+            return ["OK"]
+
+        switches = {"E": "echo", "H": "headers", "S": "spaces", "L": "linefeeds"}
+        if len(at) == 2 and at[0] in switches and at[1] in "01":
+            setattr(self, switches[at[0]], at[1] == "1")
+            return ["OK"]
+
+        if at[:2] in ("SP", "TP") and len(at) == 3:
+            self.selected_protocol = at[2]
+            return ["OK"]
+        if at.startswith("SH") and len(at) in (5, 8):
+            self.header = at[2:]
+            return ["OK"]
+        if at.startswith("ST") or at.startswith("AT") or at in ("D", "CAF0", "CAF1"):
+            return ["OK"]
+
+        return ["?"]
+
+    def obd_request(self, command):
+        if not self.ignition or self.selected_protocol not in ("0", self.protocol):
+            return ["UNABLE TO CONNECT"]
+
+        # a trailing odd digit is the "number of responses" hint
+        if len(command) % 2:
+            command = command[:-1]
+
+        request = bytes.fromhex(command)
+
+        if self.error_rate and random.random() < self.error_rate:
+            self.errors_injected += 1
+            error = random.choice(INJECTED_ERRORS)
+            if error != "DROP":
+                return [error]
+        else:
+            error = None
+
+        lines = []
+        for ecu in self.__addressed_ecus():
+            payload = self.vehicle.payload(ecu, request)
+            if payload is not None:
+                lines += self.__format(ecu, payload)
+
+        if not lines:
+            return ["NO DATA"]
+        if error == "DROP" and len(lines) > 1:
+            del lines[random.randrange(1, len(lines))]  # lose a consecutive frame
+        return lines
+
+    def __addressed_ecus(self):
+        if self.header in FUNCTIONAL_HEADERS:
+            return self.vehicle.ecus
+        for ecu in self.vehicle.ecus:
+            request_id, _, address = ECUS[ecu]
+            if self.header in ("%03X" % request_id, "DA%02XF1" % address):
+                return [ecu]
+        return []
+
+    # === Frame formatting ===
+    def __format(self, ecu, payload):
+        """ Renders a payload's ISO-TP frames the way the ELM prints them """
+        frames = isotp_frames(payload)
+        sep = " " if self.spaces else ""
+
+        if not self.headers:
+            if len(frames) == 1:
+                return [sep.join("%02X" % b for b in payload)]
+            lines = ["%03X" % len(payload)]
+            for i, frame in enumerate(frames):
+                data = frame[2:] if i == 0 else frame[1:]
+                lines.append("%X:%s%s" % (i & 0x0F, sep, sep.join("%02X" % b for b in data)))
+            return lines
+
+        _, response_id, address = ECUS[ecu]
+        if self.id_bits == 11:
+            header = "%03X" % response_id
+        else:
+            header = sep.join(["18", "DA", "F1", "%02X" % address])
+        return [header + sep + sep.join("%02X" % b for b in frame) for frame in frames]
+
+
+class SocketCANEmulator:
+    """
+        Answers OBD requests on a SocketCAN interface (e.g. vcan0) like the
+        car's ECUs would, for testing obd.OBD("socketcan://vcan0").
+    """
+
+    CAN_FRAME = struct.Struct("=IB3x8s")
+    FLOW_CONTROL_TIMEOUT = 1.0
+
+    def __init__(self, channel, protocol="6", vehicle=None, latency=0.0):
+        if protocol not in PROTOCOLS:
+            raise ValueError(f"Unsupported protocol {protocol}, use one of {', '.join(PROTOCOLS)}")
+
+        self.channel = channel
+        self.protocol = protocol
+        self.vehicle = vehicle or Vehicle()
+        self.latency = latency
+        self.requests = 0
+        self.sock = self._open_socket(channel)
+        self.__running = False
+        self.__thread = None
+
+    @property
+    def id_bits(self):
+        return PROTOCOLS[self.protocol][1]
+
+    def _open_socket(self, channel):
+        sock = socket.socket(socket.AF_CAN, socket.SOCK_RAW, socket.CAN_RAW)
+        sock.bind((channel,))
+        return sock
+
+    def start(self):
+        if self.__thread is None:
+            self.__running = True
+            self.__thread = threading.Thread(target=self.run, daemon=True)
+            self.__thread.start()
+        return self
+
+    def stop(self):
+        self.__running = False
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+
+    def close(self):
+        self.stop()
+        self.sock.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def run(self):
+        self.sock.settimeout(0.1)
+        while self.__running:
+            frame = self.__recv()
+            if frame is None:
+                continue
+            can_id, data = frame
+            ecus = self.__addressed_ecus(can_id)
+            if not ecus or data[0] & 0xF0 != 0x00:
+                continue  # not a request for us (or a stray flow control frame)
+
+            self.requests += 1
+            request = bytes(data[1:1 + (data[0] & 0x0F)])
+            if self.latency:
+                time.sleep(self.latency)
+            for ecu in ecus:
+                payload = self.vehicle.payload(ecu, request)
+                if payload is not None:
+                    self.__respond(ecu, payload)
+
+    def __addressed_ecus(self, can_id):
+        if can_id in (0x7DF, 0x18DB33F1):
+            return self.vehicle.ecus
+        for ecu in self.vehicle.ecus:
+            request_id, _, address = ECUS[ecu]
+            if can_id in (request_id, 0x18DA00F1 | (address << 8)):
+                return [ecu]
+        return []
+
+    def __respond(self, ecu, payload):
+        _, response_id, address = ECUS[ecu]
+        if self.id_bits == 29:
+            response_id = 0x18DAF100 | address
+
+        frames = isotp_frames(payload)
+        self.__send(response_id, frames[0])
+        if len(frames) > 1 and not self.__wait_flow_control():
+            return  # the tester never asked for the rest
+        for frame in frames[1:]:
+            self.__send(response_id, frame)
+
+    def __wait_flow_control(self):
+        deadline = time.monotonic() + self.FLOW_CONTROL_TIMEOUT
+        while time.monotonic() < deadline:
+            frame = self.__recv()
+            if frame is not None and frame[1][0] & 0xF0 == 0x30:
+                return True
+        return False
+
+    def __send(self, can_id, data):
+        if self.id_bits == 29:
+            can_id |= socket.CAN_EFF_FLAG
+        data = bytes(data).ljust(8, b"\x00")
+        self.sock.send(self.CAN_FRAME.pack(can_id, 8, data))
+
+    def __recv(self):
+        try:
+            raw = self.sock.recv(self.CAN_FRAME.size)
+        except socket.timeout:
+            return None
+        except OSError:
+            self.__running = False
+            return None
+        if len(raw) != self.CAN_FRAME.size:
+            return None
+        can_id, dlc, data = self.CAN_FRAME.unpack(raw)
+        return can_id & socket.CAN_EFF_MASK, data[:dlc]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ELM327 emulator on a pseudo terminal")
+    parser.add_argument("--protocol", default="6", choices=sorted(PROTOCOLS))
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="random extra latency, in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="probability of an injected error")
+    parser.add_argument("--transmission", action="store_true", help="add a transmission ECU")
+    parser.add_argument("--dtc", action="append", default=[], help="trouble code to report (repeatable)")
+    parser.add_argument("--parked", action="store_true", help="start with the ignition off, Enter toggles it")
+    parser.add_argument("--socketcan", metavar="CHANNEL", help="answer as ECUs on a SocketCAN interface (e.g. vcan0) instead")
+    args = parser.parse_args()
+
+    if args.socketcan:
+        vehicle = Vehicle(transmission=args.transmission, dtcs=args.dtc)
+        with SocketCANEmulator(args.socketcan, args.protocol, vehicle, args.latency) as emulator:
+            print(f"ECU emulator answering on {args.socketcan}, connect with obd.OBD('socketcan://{args.socketcan}')")
+            try:
+                while True:
+                    time.sleep(1)
+            except KeyboardInterrupt:
+                print(f"Served {emulator.requests} requests")
+        return
+
+    emulator = ELM327Emulator(args.protocol, latency=args.latency, jitter=args.jitter,
+                              error_rate=args.error_rate, transmission=args.transmission,
+                              dtcs=args.dtc, ignition=not args.parked)
+    with emulator:
+        print(f"ELM327 emulator listening on {emulator.port_name}")
+        try:
+            while True:
+                if args.parked:
+                    input()
+                    emulator.ignition = not emulator.ignition
+                    print(f"Ignition {'on' if emulator.ignition else 'off'}")
+                else:
+                    time.sleep(1)
+        except (KeyboardInterrupt, EOFError):
+            print(f"Served {emulator.requests} requests ({emulator.errors_injected} injected errors)")
+
+
+if __name__ == "__main__":
+    main()
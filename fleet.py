@@ -0,0 +1,247 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import random
+import time
+
+import websockets
+from obd.instrumentation import percentile
+
+from demo import VehicleSimulator
+
+try:
+    import numpy as np
+except ImportError:
+    np = None  # one VehicleSimulator per vehicle instead of batches
+
+# === Fleet Configuration ===
+DEFAULT_URL = "ws://127.0.0.1:8765"  # relay.py
+DEFAULT_PATH = "/vehicle/{id}"
+DEFAULT_VEHICLES = 1000
+DEFAULT_DURATION = 60  # seconds
+SEND_INTERVAL = 0.5  # seconds between two samples of a vehicle, like demo.py
+SLICES = 10  # the fleet is stepped in slices spread over the interval, not all at once
+CONNECT_CONCURRENCY = 100  # handshakes in flight at once per worker
+RECONNECT_DELAY = 1.0  # seconds before a dropped vehicle reconnects
+LATENCY_SAMPLES = 100000  # per worker, reservoir sampled
+
+COLUMNS = ["RPM", "SPEED", "COOLANT_TEMP", "ENGINE_LOAD", "THROTTLE_POS", "INTAKE_TEMP", "ELM_VOLTAGE", "MAF"]
+DECIMALS = {"RPM": 1, "SPEED": 1, "COOLANT_TEMP": 0, "ENGINE_LOAD": 2, "THROTTLE_POS": 2,
+            "INTAKE_TEMP": 0, "ELM_VOLTAGE": 2, "MAF": 2}
+
+
+# === Simulation ===
+class FleetSimulator:
+    """
+        VehicleSimulator's model for many vehicles at once: every signal is a
+        column with one row per vehicle, and a step updates whole columns with
+        NumPy instead of looping over vehicle objects.
+    """
+
+    def __init__(self, count):
+        self.count = count
+        self.rpm = np.full(count, 800.0)
+        self.speed = np.zeros(count)
+        self.coolant_temp = np.full(count, 75.0)
+        self.engine_load = np.full(count, 10.0)
+        self.throttle_pos = np.zeros(count)
+        self.intake_temp = np.full(count, 25.0)
+        self.elm_voltage = np.full(count, 14.1)
+        self.maf = np.full(count, 2.0)
+        self.random = np.random.default_rng()
+
+    def uniform(self, low, high):
+        return self.random.uniform(low, high, self.count)
+
+    def generate_data(self):
+        """ Steps every vehicle; returns {PID name: list of values, one per vehicle} """
+        self.throttle_pos = np.clip(self.throttle_pos + self.uniform(-5, 5), 0, 100)
+        self.speed = np.clip(self.speed + self.uniform(-2, 3) * self.throttle_pos / 100, 0, 180)
+        self.rpm = np.clip(700 + self.speed * 30 + self.throttle_pos * 10 + self.uniform(-200, 200), 700, 6000)
+        self.engine_load = np.minimum(100, self.throttle_pos * 0.6 + self.rpm / 10000 * 40 + self.uniform(-2, 2))
+        warming = np.where(self.coolant_temp < 90, self.uniform(0.1, 0.5), self.uniform(-0.2, 0.2))
+        self.coolant_temp = np.clip(self.coolant_temp + warming, 70, 120)
+        self.intake_temp = np.clip(self.intake_temp + self.uniform(-1, 1), 10, 50)
+        self.elm_voltage = np.clip(self.elm_voltage + self.uniform(-0.05, 0.05), 13.5, 14.5)
+        self.maf = np.clip(self.rpm * self.engine_load / 12000 + self.uniform(-1, 1), 0, 100)
+
+        columns = {
+            "RPM": self.rpm, "SPEED": self.speed, "COOLANT_TEMP": self.coolant_temp,
+            "ENGINE_LOAD": self.engine_load, "THROTTLE_POS": self.throttle_pos,
+            "INTAKE_TEMP": self.intake_temp, "ELM_VOLTAGE": self.elm_voltage, "MAF": self.maf,
+        }
+        return {name: np.round(values, DECIMALS[name]).tolist() for name, values in columns.items()}
+
+
+class SimulatorList:
+    """ The same columns from one VehicleSimulator per vehicle, where NumPy isn't installed """
+
+    def __init__(self, count):
+        self.count = count
+        self.simulators = [VehicleSimulator() for _ in range(count)]
+
+    def generate_data(self):
+        rows = [simulator.generate_data() for simulator in self.simulators]
+        return {name: [row[name] for row in rows] for name in COLUMNS}
+
+
+def make_simulator(count):
+    return FleetSimulator(count) if np is not None else SimulatorList(count)
+
+
+# === Load generation ===
+class Stats:
+    def __init__(self):
+        self.sent = 0
+        self.connects = 0
+        self.errors = {}  # error type: count
+        self.latencies = []  # seconds from a vehicle's tick to its last send completing
+        self.connect_times = []
+        self.__seen = 0
+
+    def error(self, e):
+        name = type(e).__name__
+        self.errors[name] = self.errors.get(name, 0) + 1
+
+    def latency(self, seconds):
+        # reservoir sampling keeps memory flat on long runs
+        self.__seen += 1
+        if len(self.latencies) < LATENCY_SAMPLES:
+            self.latencies.append(seconds)
+        else:
+            i = random.randrange(self.__seen)
+            if i < LATENCY_SAMPLES:
+                self.latencies[i] = seconds
+
+    def result(self):
+        return {"sent": self.sent, "connects": self.connects, "errors": self.errors,
+                "latencies": self.latencies, "connect_times": self.connect_times}
+
+
+class Fleet:
+    """ Simulated vehicles, each on its own websocket, sending every PID every SEND_INTERVAL """
+
+    def __init__(self, url, path, first_id, count):
+        self.url = url
+        self.path = path
+        self.ids = range(first_id, first_id + count)
+        self.sockets = [None] * count
+        self.stats = Stats()
+        self.__connecting = set()
+        self.__tasks = set()  # reconnects in flight, referenced until done
+        self.__limit = asyncio.Semaphore(CONNECT_CONCURRENCY)
+        # slices of vehicles, each with its own batch simulator and phase in the interval
+        bounds = [count * i // SLICES for i in range(SLICES + 1)]
+        self.slices = [(range(bounds[i], bounds[i + 1]), make_simulator(bounds[i + 1] - bounds[i]))
+                       for i in range(SLICES) if bounds[i + 1] > bounds[i]]
+
+    async def connect(self, i):
+        self.__connecting.add(i)
+        try:
+            async with self.__limit:
+                started = time.perf_counter()
+                self.sockets[i] = await websockets.connect(self.url + self.path.format(id=self.ids[i]))
+                self.stats.connect_times.append(time.perf_counter() - started)
+                self.stats.connects += 1
+        except Exception as e:
+            self.stats.error(e)
+            await asyncio.sleep(RECONNECT_DELAY)
+        finally:
+            self.__connecting.discard(i)
+
+    async def send(self, i, messages, tick):
+        ws = self.sockets[i]
+        try:
+            for message in messages:
+                await ws.send(message)
+            self.stats.sent += len(messages)
+            self.stats.latency(time.perf_counter() - tick)
+        except Exception as e:
+            self.stats.error(e)
+            self.sockets[i] = None
+
+    async def run_slice(self, vehicles, simulator, offset, until):
+        await asyncio.sleep(offset)
+        tick = time.perf_counter()
+        while tick < until:
+            columns = simulator.generate_data()
+            sends = []
+            for row, i in enumerate(vehicles):
+                if self.sockets[i] is None:
+                    if i not in self.__connecting:
+                        task = asyncio.create_task(self.connect(i))
+                        self.__tasks.add(task)
+                        task.add_done_callback(self.__tasks.discard)
+                    continue
+                messages = [json.dumps({"command": name, "value": columns[name][row]}) for name in COLUMNS]
+                sends.append(self.send(i, messages, tick))
+            await asyncio.gather(*sends)
+
+            tick += SEND_INTERVAL
+            await asyncio.sleep(max(0.0, tick - time.perf_counter()))
+
+    async def run(self, duration):
+        await asyncio.gather(*[self.connect(i) for i in range(len(self.sockets))])
+        until = time.perf_counter() + duration
+        await asyncio.gather(*[self.run_slice(vehicles, simulator, SEND_INTERVAL * n / len(self.slices), until)
+                               for n, (vehicles, simulator) in enumerate(self.slices)])
+        for ws in self.sockets:
+            if ws is not None:
+                await ws.close()
+        return self.stats.result()
+
+
+def run_worker(url, path, first_id, count, duration, results):
+    results.put(asyncio.run(Fleet(url, path, first_id, count).run(duration)))
+
+
+# === Report ===
+def print_report(results, vehicles, workers, duration, wall):
+    sent = sum(r["sent"] for r in results)
+    latencies = sorted(l for r in results for l in r["latencies"])
+    connect_times = sorted(t for r in results for t in r["connect_times"])
+    errors = {}
+    for r in results:
+        for name, count in r["errors"].items():
+            errors[name] = errors.get(name, 0) + count
+    target = vehicles * len(COLUMNS) / SEND_INTERVAL
+
+    print(f"{vehicles} vehicles in {workers} worker(s), {'NumPy batches' if np is not None else 'per-vehicle simulators'}")
+    print(f"connects: {sum(r['connects'] for r in results)}, handshake p50 {percentile(connect_times, 50) * 1000:.1f} ms "
+          f"p99 {percentile(connect_times, 99) * 1000:.1f} ms")
+    print(f"sent {sent} messages in {wall:.1f} s: {sent / duration:.0f}/s of {target:.0f}/s targeted")
+    print(f"tick to sent: p50 {percentile(latencies, 50) * 1000:.1f} ms, p99 {percentile(latencies, 99) * 1000:.1f} ms, "
+          f"max {(latencies[-1] if latencies else 0) * 1000:.1f} ms")
+    print(f"errors: {errors or 'none'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fleet load generator, simulated vehicles on websockets")
+    parser.add_argument("--url", default=DEFAULT_URL)
+    parser.add_argument("--path", default=DEFAULT_PATH, help="appended to the URL, {id} is the vehicle number")
+    parser.add_argument("--vehicles", type=int, default=DEFAULT_VEHICLES)
+    parser.add_argument("--workers", type=int, default=1, help="processes sharing the vehicles")
+    parser.add_argument("--duration", type=float, default=DEFAULT_DURATION, help="seconds of sending")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    if args.workers == 1:
+        results = [asyncio.run(Fleet(args.url, args.path, 0, args.vehicles).run(args.duration))]
+    else:
+        queue = multiprocessing.Queue()
+        bounds = [args.vehicles * i // args.workers for i in range(args.workers + 1)]
+        processes = [multiprocessing.Process(target=run_worker,
+                                             args=(args.url, args.path, bounds[i], bounds[i + 1] - bounds[i],
+                                                   args.duration, queue))
+                     for i in range(args.workers)]
+        for process in processes:
+            process.start()
+        results = [queue.get() for _ in processes]
+        for process in processes:
+            process.join()
+    print_report(results, args.vehicles, args.workers, args.duration, time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    main()
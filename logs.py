@@ -0,0 +1,168 @@
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+
+# === Logging Configuration ===
+FORMAT = "%(asctime)s %(levelname)s [%(name)s] %(message)s"
+QUEUE_SIZE = 10000  # records waiting for the writer thread, newer ones are dropped when full
+DEBUG_TIMEOUT = 600  # seconds before a remotely enabled debug mode turns itself off
+
+listener = None
+_listener_pid = None  # a forked process inherits the listener, but not its thread
+base_levels = {}  # logger name: level outside of debug mode
+debug = False
+_debug_timer = None
+
+
+# === Filters ===
+class Throttle(logging.Filter):
+    """
+        Per-category sampling and rate limits, so a chatty category can't
+        flood the SD card. A category is a logger name and covers its children
+        ("obd" covers "obd.elm327"); the most specific one applies.
+        - limits: {category: (records per second, burst)}, a token bucket
+        - sampling: {category: n}, keeps one record in n
+        The next record let through says how many were dropped before it.
+    """
+
+    def __init__(self, limits=None, sampling=None):
+        super().__init__()
+        self.limits = limits or {}
+        self.sampling = sampling or {}
+        self.dropped = 0
+        self.__buckets = {}  # category: (tokens, last refill)
+        self.__seen = {}  # category: records seen, for sampling
+        self.__suppressed = {}  # category: records dropped since the last one let through
+        self.__lock = threading.Lock()  # records come from every thread
+
+    def category(self, name, table):
+        while name:
+            if name in table:
+                return name
+            name = name.rpartition(".")[0]
+        return None
+
+    def filter(self, record):
+        with self.__lock:
+            sampled = self.category(record.name, self.sampling)
+            if sampled is not None:
+                seen = self.__seen[sampled] = self.__seen.get(sampled, 0) + 1
+                if seen % self.sampling[sampled]:
+                    return self.__drop(sampled)
+
+            limited = self.category(record.name, self.limits)
+            if limited is not None:
+                rate, burst = self.limits[limited]
+                now = time.monotonic()
+                tokens, last = self.__buckets.get(limited, (burst, now))
+                tokens = min(burst, tokens + (now - last) * rate)
+                if tokens < 1:
+                    self.__buckets[limited] = (tokens, now)
+                    return self.__drop(limited)
+                self.__buckets[limited] = (tokens - 1, now)
+
+            category = limited or sampled
+            suppressed = self.__suppressed.pop(category, 0) if category is not None else 0
+
+        if suppressed:
+            record.msg = f"{record.msg} (+{suppressed} suppressed)"
+        return True
+
+    def __drop(self, category):
+        self.__suppressed[category] = self.__suppressed.get(category, 0) + 1
+        self.dropped += 1
+        return False
+
+
+# === Handlers ===
+class QueueHandler(logging.handlers.QueueHandler):
+    """ Never blocks the logging thread: when the writer is behind, records are dropped and counted """
+
+    def __init__(self, records):
+        super().__init__(records)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup(path=None, max_bytes=1024 * 1024, backups=3, levels=None, limits=None, sampling=None, console=None):
+    """
+        Routes every log record through a bounded queue to a writer thread, so
+        logging on the hot path is a filter and a queue put, never I/O.
+        - path: a log file rotated at max_bytes, keeping `backups` old ones
+        - levels: {logger name: level}, e.g. {"obd": logging.WARNING}
+        - console: also write to stdout, by default when it's a terminal
+    """
+    global listener, _listener_pid
+    stop()
+
+    handlers = []
+    formatter = logging.Formatter(FORMAT)
+    if path:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        file_handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups)
+        file_handler.setFormatter(formatter)
+        handlers.append(file_handler)
+    if console or (console is None and (sys.stdout.isatty() or not path)):
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setFormatter(formatter)
+        handlers.append(console_handler)
+
+    records = queue.Queue(QUEUE_SIZE)
+    queue_handler = QueueHandler(records)
+    queue_handler.addFilter(Throttle(limits, sampling))
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    # python-OBD logs to stderr on its own, let it go through the queue instead
+    obd_logger = logging.getLogger("obd")
+    for handler in obd_logger.handlers[:]:
+        obd_logger.removeHandler(handler)
+
+    base_levels.clear()
+    base_levels.update({"": logging.INFO})
+    base_levels.update(levels or {})
+    apply_levels()
+
+    listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+    listener.start()
+    _listener_pid = os.getpid()
+    return queue_handler
+
+
+def apply_levels():
+    for name, level in base_levels.items():
+        logging.getLogger(name or None).setLevel(logging.DEBUG if debug else level)
+
+
+def set_debug(enabled, timeout=DEBUG_TIMEOUT):
+    """ Turns debug logging on or off everywhere; when on, it turns itself off after `timeout` seconds """
+    global debug, _debug_timer
+    if _debug_timer is not None:
+        _debug_timer.cancel()
+        _debug_timer = None
+    debug = enabled
+    apply_levels()
+    if enabled and timeout:
+        _debug_timer = threading.Timer(timeout, set_debug, (False,))
+        _debug_timer.daemon = True
+        _debug_timer.start()
+    logging.getLogger("logs").warning("Debug logging %s", "on" if enabled else "off")
+
+
+def stop():
+    """ Writes out the records still queued """
+    global listener
+    if listener is not None and _listener_pid == os.getpid():
+        listener.stop()
+    listener = None
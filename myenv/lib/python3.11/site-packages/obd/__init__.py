@@ -46,6 +46,7 @@ from .OBDResponse import OBDResponse
 from .protocols import ECU
 from .utils import scan_serial, OBDStatus
 from .UnitsAndScaling import Unit
+from .instrumentation import metrics
 
 import logging
 
@@ -33,12 +33,73 @@
 import time
 import threading
 import logging
+from array import array
+from collections import deque
 from .OBDResponse import OBDResponse
 from .obd import OBD
+from .instrumentation import metrics
+from .history import History
 
 logger = logging.getLogger(__name__)
 
 
+class Dispatcher(object):
+    """
+        Runs callbacks on a thread of its own, so a slow consumer never
+        delays the next serial request. The polling thread only appends to
+        a bounded deque (atomic, no lock); when the consumer falls behind,
+        the oldest pending responses are dropped and counted as overflows.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.overflows = 0
+        self.__pending = deque(maxlen=size)  # (callbacks, response)
+        self.__ready = threading.Event()
+        self.__running = False
+        self.__thread = None
+
+    def start(self):
+        if self.__thread is None:
+            self.__running = True
+            self.__thread = threading.Thread(target=self.run)
+            self.__thread.daemon = True
+            self.__thread.start()
+
+    def stop(self):
+        if self.__thread is not None:
+            self.__running = False
+            self.__ready.set()
+            self.__thread.join()
+            self.__thread = None
+
+    def put(self, callbacks, response):
+        if len(self.__pending) == self.size:
+            self.overflows += 1
+            if metrics.enabled:
+                metrics.count("callback_overflows")
+        self.__pending.append((callbacks, response))
+        self.__ready.set()
+
+    def run(self):
+        while self.__running:
+            self.__ready.wait()
+            self.__ready.clear()
+            while True:
+                try:
+                    callbacks, response = self.__pending.popleft()
+                except IndexError:
+                    break
+                start = metrics.start() if metrics.enabled else None
+                for callback in callbacks:
+                    try:
+                        callback(response)
+                    except Exception as e:
+                        logger.exception("Callback failed for %s: %s" % (response.command, e))
+                if start is not None:
+                    metrics.stop("callbacks", start)
+
+
 class Async(OBD):
     """
         Class representing an OBD-II connection with it's assorted commands/sensors
@@ -47,15 +108,29 @@ class Async(OBD):
 
     def __init__(self, portstr=None, baudrate=None, protocol=None, fast=True,
                  timeout=0.1, check_voltage=True, start_low_power=False,
-                 delay_cmds=0.25):
+                 delay_cmds=0.25, link_profile=False, physical_addressing=False,
+                 dispatch_size=0, history_size=0, functional_interval=1):
         self.__thread = None
         super(Async, self).__init__(portstr, baudrate, protocol, fast,
-                                    timeout, check_voltage, start_low_power)
+                                    timeout, check_voltage, start_low_power,
+                                    link_profile, physical_addressing)
         self.__commands = {}   # key = OBDCommand, value = Response
-        self.__callbacks = {}  # key = OBDCommand, value = list of Functions
+        # (polling order, {OBDCommand: tuple of Functions}), never modified in place:
+        # watch() and unwatch() build a new table, the daemon thread picks it up
+        # at the start of its next cycle
+        self.__table = ([], {})
+        self.__lock = threading.Lock()  # serializes writers of the table and the responses
         self.__running = False
         self.__was_running = False  # used with __enter__() and __exit__()
         self.__delay_cmds = delay_cmds
+        # with a dispatch_size, callbacks run on a Dispatcher thread instead of the polling thread
+        self.dispatcher = Dispatcher(dispatch_size) if dispatch_size > 0 else None
+        self.__history_size = history_size
+        self.__histories = {}  # key = OBDCommand, value = History of its numeric values
+        # with physical addressing, the commands still broadcast (like GET_DTC)
+        # are only polled every functional_interval cycles: each time they are,
+        # the adapter switches header twice (AT SH there and back)
+        self.__functional_interval = max(1, functional_interval)
 
     @property
     def running(self):
@@ -67,13 +142,15 @@ class Async(OBD):
             logger.info("Async thread not started because no connection was made")
             return
 
-        if len(self.__commands) == 0:
+        if len(self.__table[0]) == 0:
             logger.info("Async thread not started because no commands were registered")
             return
 
         if self.__thread is None:
             logger.info("Starting async thread")
             self.__running = True
+            if self.dispatcher is not None:
+                self.dispatcher.start()
             self.__thread = threading.Thread(target=self.run)
             self.__thread.daemon = True
             self.__thread.start()
@@ -86,6 +163,8 @@ class Async(OBD):
             self.__thread.join()
             self.__thread = None
             logger.info("Async thread stopped")
+        if self.dispatcher is not None:
+            self.dispatcher.stop()
 
     def paused(self):
         """
@@ -126,64 +205,83 @@ class Async(OBD):
             Subscribes the given command for continuous updating. Once subscribed,
             query() will return that command's latest value. Optional callbacks can
             be given, which will be fired upon every new value.
+            Can be called while running, the change applies from the next cycle.
         """
 
-        # the dict shouldn't be changed while the daemon thread is iterating
-        if self.__running:
-            logger.warning("Can't watch() while running, please use stop()")
-        else:
+        if not force and not self.test_cmd(c):
+            # self.test_cmd() will print warnings
+            return
 
-            if not force and not self.test_cmd(c):
-                # self.test_cmd() will print warnings
-                return
+        with self.__lock:
+            callbacks = dict(self.__table[1])
 
             # new command being watched, store the command
-            if c not in self.__commands:
+            if c not in callbacks:
                 logger.info("Watching command: %s" % str(c))
                 self.__commands[c] = OBDResponse()  # give it an initial value
-                self.__callbacks[c] = []  # create an empty list
+                callbacks[c] = ()
+                if self.__history_size > 0:
+                    self.__histories[c] = History(self.__history_size)
 
             # if a callback was given, push it
-            if hasattr(callback, "__call__") and (callback not in self.__callbacks[c]):
+            if hasattr(callback, "__call__") and (callback not in callbacks[c]):
                 logger.info("subscribing callback for command: %s" % str(c))
-                self.__callbacks[c].append(callback)
+                callbacks[c] += (callback,)
+
+            self.__table = (self.__plan_commands(callbacks), callbacks)
 
     def unwatch(self, c, callback=None):
         """
             Unsubscribes a specific command (and optionally, a specific callback)
             from being updated. If no callback is specified, all callbacks for
             that command are dropped.
+            Can be called while running, the change applies from the next cycle.
         """
 
-        # the dict shouldn't be changed while the daemon thread is iterating
-        if self.__running:
-            logger.warning("Can't unwatch() while running, please use stop()")
-        else:
-            logger.info("Unwatching command: %s" % str(c))
+        logger.info("Unwatching command: %s" % str(c))
+
+        with self.__lock:
+            callbacks = dict(self.__table[1])
+            if c not in callbacks:
+                return
+
+            # if a callback was specified, only remove the callback
+            if hasattr(callback, "__call__") and (callback in callbacks[c]):
+                callbacks[c] = tuple(f for f in callbacks[c] if f != callback)
 
-            if c in self.__commands:
-                # if a callback was specified, only remove the callback
-                if hasattr(callback, "__call__") and (callback in self.__callbacks[c]):
-                    self.__callbacks[c].remove(callback)
+                # if no more callbacks are left, remove the command entirely
+                if len(callbacks[c]) == 0:
+                    callbacks.pop(c)
+            else:
+                # no callback was specified, pop everything
+                callbacks.pop(c)
 
-                    # if no more callbacks are left, remove the command entirely
-                    if len(self.__callbacks[c]) == 0:
-                        self.__commands.pop(c, None)
-                else:
-                    # no callback was specified, pop everything
-                    self.__callbacks.pop(c, None)
-                    self.__commands.pop(c, None)
+            if c not in callbacks:
+                self.__commands.pop(c, None)
+                self.__histories.pop(c, None)
+            self.__table = (self.__plan_commands(callbacks), callbacks)
 
     def unwatch_all(self):
         """ Unsubscribes all commands and callbacks from being updated """
-
-        # the dict shouldn't be changed while the daemon thread is iterating
-        if self.__running:
-            logger.warning("Can't unwatch_all() while running, please use stop()")
-        else:
-            logger.info("Unwatching all")
+        logger.info("Unwatching all")
+        with self.__lock:
+            self.__table = ([], {})
             self.__commands = {}
-            self.__callbacks = {}
+            self.__histories = {}
+
+    def __plan_commands(self, callbacks):
+        """
+            Orders the watched commands so that the ones sent with the same
+            header (and to the same ECU) are polled back to back. Every
+            header change costs an extra AT SH round trip, so a cycle over
+            engine and transmission PIDs only switches once per group instead
+            of on nearly every query. Groups are kept in the order they were
+            first watched, so the order is the same on every cycle.
+        """
+        groups = {}  # key = (header, ECU), value = list of OBDCommands
+        for c in callbacks:
+            groups.setdefault((self.header_for(c), c.ecu), []).append(c)
+        return [c for group in groups.values() for c in group]
 
     def query(self, c, force=False):
         """
@@ -191,20 +289,41 @@ class Async(OBD):
             Only commands that have been watch()ed will return valid responses
         """
 
-        if c in self.__commands:
-            return self.__commands[c]
-        else:
-            return OBDResponse()
+        return self.__commands.get(c, OBDResponse())
+
+    def history(self, c, seconds=None):
+        """
+            Returns (timestamps, values) arrays of the watched command's
+            numeric values over the last `seconds` (or all that are kept),
+            oldest first. Needs a history_size; empty for other commands.
+        """
+        history = self.__histories.get(c)
+        if history is None:
+            return array('d'), array('d')
+        return history.window(seconds)
 
     def run(self):
         """ Daemon thread """
 
+        cycles = 0
+
         # loop until the stop signal is received
         while self.__running:
 
-            if len(self.__commands) > 0:
+            # the tables in use for this whole cycle
+            plan, callbacks = self.__table
+
+            if len(plan) > 0:
+                cycle = metrics.start() if metrics.enabled else None
+                switches = self.header_switches
+                skip_functional = self.functional_header is not None and cycles % self.__functional_interval != 0
+                cycles += 1
+
                 # loop over the requested commands, send, and collect the response
-                for c in self.__commands:
+                for c in plan:
+                    if skip_functional and self.header_for(c) == self.functional_header:
+                        continue
+
                     if not self.is_connected():
                         logger.info("Async thread terminated because device disconnected")
                         self.__running = False
@@ -212,14 +331,41 @@ class Async(OBD):
                         return
 
                     # force, since commands are checked for support in watch()
+                    start = metrics.start() if cycle is not None else None
                     r = super(Async, self).query(c, force=True)
 
-                    # store the response
-                    self.__commands[c] = r
+                    # store the response, unless it was unwatched meanwhile
+                    # (under the lock, so an unwatch can't slip in between)
+                    with self.__lock:
+                        if c in self.__commands:
+                            self.__commands[c] = r
+
+                            history = self.__histories.get(c)
+                            if history is not None:
+                                value = getattr(r.value, "magnitude", r.value)
+                                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                                    history.append(r.time, value)
+
+                    if start is not None:
+                        metrics.stop("query", start)
 
                     # fire the callbacks, if there are any
-                    for callback in self.__callbacks[c]:
+                    if not callbacks[c]:
+                        continue
+                    if self.dispatcher is not None:
+                        self.dispatcher.put(callbacks[c], r)
+                        continue
+
+                    start = metrics.start() if cycle is not None else None
+                    for callback in callbacks[c]:
                         callback(r)
+
+                    if start is not None:
+                        metrics.stop("callbacks", start)
+
+                if cycle is not None:
+                    metrics.stop("cycle", cycle)
+                    metrics.gauge("header_switches_per_cycle", self.header_switches - switches)
                 time.sleep(self.__delay_cmds)
 
             else:
@@ -30,15 +30,21 @@
 #                                                                      #
 ########################################################################
 
+import math
 import re
 import serial
 import time
 import logging
 from .protocols import *
 from .utils import OBDStatus
+from .instrumentation import metrics
 
 logger = logging.getLogger(__name__)
 
+# make python-OBD's own port URLs (record://, replay://) known to serial_for_url()
+if "obd.transports" not in serial.protocol_handler_packages:
+    serial.protocol_handler_packages.append("obd.transports")
+
 
 class ELM327:
     """
@@ -105,8 +111,15 @@ class ELM327:
     # going to be less picky about the time required to detect it.
     _TRY_BAUDS = [38400, 9600, 230400, 115200, 57600, 19200]
 
+    # AT ST counts in units of 4.096 ms. 0x32 (~205 ms) is the power-on default
+    _ST_UNIT = 0.004096
+    _ST_DEFAULT = 0x32
+    _ST_MIN = 0x08  # never wait less than ~33 ms for an ECU
+    _ST_MARGIN = 2.0  # multiple of the slowest measured reply
+    _ST_SAMPLES = 5
+
     def __init__(self, portname, baudrate, protocol, timeout,
-                 check_voltage=True, start_low_power=False):
+                 check_voltage=True, start_low_power=False, link_profile=False):
         """Initializes port by resetting device and gettings supported PIDs. """
 
         logger.info("Initializing ELM327: PORT=%s BAUD=%s PROTOCOL=%s" %
@@ -121,6 +134,7 @@ class ELM327:
         self.__protocol = UnknownProtocol([])
         self.__low_power = False
         self.timeout = timeout
+        self.link_profile = {}
 
         # ------------- open port -------------
         try:
@@ -193,20 +207,39 @@ class ELM327:
             self.__status = OBDStatus.OBD_CONNECTED
 
         # try to communicate with the car, and load the correct protocol parser
+        self.connect_car(protocol, link_profile)
+
+    def connect_car(self, protocol=None, link_profile=False):
+        """
+            Searches for the car's protocol on the already initialized
+            adapter, without resetting it (no ATZ). Used at connect time,
+            and again when the ignition comes on after the adapter was
+            opened with the car off. Returns True once the car answers.
+        """
+
+        if self.__status == OBDStatus.NOT_CONNECTED:
+            return False
+
         if self.set_protocol(protocol):
             self.__status = OBDStatus.CAR_CONNECTED
+            if metrics.enabled:
+                metrics.count("connects")
             logger.info("Connected Successfully: PORT=%s BAUD=%s PROTOCOL=%s" %
                         (
-                            portname,
+                            self.port_name(),
                             self.__port.baudrate,
                             self.__protocol.ELM_ID,
                         ))
+            if link_profile:
+                self.negotiate_link_profile()
+            return True
+
+        if self.__status == OBDStatus.OBD_CONNECTED:
+            logger.error("Adapter connected, but the ignition is off")
         else:
-            if self.__status == OBDStatus.OBD_CONNECTED:
-                logger.error("Adapter connected, but the ignition is off")
-            else:
-                logger.error("Connected to the adapter, "
-                             "but failed to connect to the vehicle")
+            logger.error("Connected to the adapter, "
+                         "but failed to connect to the vehicle")
+        return False
 
     def set_protocol(self, protocol_):
         if protocol_ is not None:
@@ -284,12 +317,81 @@ class ELM327:
         logger.error("Failed to determine protocol")
         return False
 
+    def negotiate_link_profile(self):
+        """
+            Tunes the adapter for the shortest round trips with this car:
+
+                ATS0     no spaces between the hex bytes (fewer bytes per line)
+                ATAT2/1  adaptive timing, so the adapter learns the ECU's pace
+                ATST     response timeout measured from the ECU's actual replies
+
+            Each setting is checked against a live 0100 request, and rolled
+            back if the adapter doesn't honour it. Returns the settings in use.
+        """
+
+        profile = {"spaces": True, "adaptive_timing": None, "st": self._ST_DEFAULT}
+
+        # ---------------------------- ATS0 (spaces OFF) -----------------------------
+        if self.__isok(self.__send(b"ATS0")):
+            r = self.__send(b"0100")
+            hex_lines = [l for l in r if l and all(c in "0123456789ABCDEFabcdef " for c in l)]
+            if hex_lines and not any(" " in l for l in hex_lines):
+                profile["spaces"] = False
+            else:
+                logger.info("Adapter ignored ATS0, keeping spaces")
+                self.__send(b"ATS1")
+
+        # ------------------------ ATAT2 / ATAT1 (adaptive timing) -------------------
+        for mode in (b"2", b"1"):
+            if self.__isok(self.__send(b"ATAT" + mode)) and self.__answers_0100():
+                profile["adaptive_timing"] = int(mode)
+                break
+        else:
+            logger.info("Adapter has no adaptive timing, using ATAT0")
+            self.__send(b"ATAT0")
+
+        # --------------------------- ATST (measured timeout) ------------------------
+        slowest = 0.0
+        for _ in range(self._ST_SAMPLES):
+            start = time.monotonic()
+            r = self.__send(b"01001")  # return on the first response, don't wait out the timeout
+            if not self.__answers(r):
+                slowest = None
+                break
+            slowest = max(slowest, time.monotonic() - start)
+
+        if slowest is not None:
+            st = int(math.ceil(slowest * self._ST_MARGIN / self._ST_UNIT))
+            st = max(self._ST_MIN, min(0xFF, st))
+            if self.__isok(self.__send(b"ATST" + ("%02X" % st).encode())) and self.__answers_0100():
+                profile["st"] = st
+            else:
+                logger.info("ECU missed the measured ATST %02X, restoring the default" % st)
+                self.__send(b"ATST" + ("%02X" % self._ST_DEFAULT).encode())
+
+        profile["st_ms"] = round(profile["st"] * self._ST_UNIT * 1000, 1)
+        logger.info("Link profile: %s" % profile)
+        self.link_profile = profile
+        return profile
+
+    def __answers_0100(self):
+        return self.__answers(self.__send(b"0100"))
+
+    def __answers(self, lines):
+        """ whether an OBD request got an actual answer from the car """
+        return bool(lines) and not self.__has_message(lines, "NO DATA") and \
+            not self.__has_message(lines, "ERROR") and not self.__has_message(lines, "?")
+
     def set_baudrate(self, baud):
         if baud is None:
             # when connecting to pseudo terminal, don't bother with auto baud
             if self.port_name().startswith("/dev/pts"):
                 logger.debug("Detected pseudo terminal, skipping baudrate setup")
                 return True
+            # nor over an RFCOMM socket, which has no baud rate
+            if self.port_name().startswith("rfcomm://"):
+                logger.debug("Detected RFCOMM socket, skipping baudrate setup")
+                return True
             else:
                 return self.auto_baudrate()
         else:
@@ -345,8 +447,10 @@ class ELM327:
             return len(lines) == 1 and lines[0] == 'OK'
 
     def __has_message(self, lines, text):
+        # compare without spaces, since ATS0 adapters may drop them from messages too
+        text = text.replace(" ", "")
         for line in lines:
-            if text in line:
+            if text in line.replace(" ", ""):
                 return True
         return False
 
@@ -367,6 +471,25 @@ class ELM327:
     def ecus(self):
         return self.__protocol.ecu_map.values()
 
+    def ecu_map(self):
+        """ returns {tx_id: ECU} as discovered from the 0100 responses """
+        return dict(self.__protocol.ecu_map)
+
+    def read_voltage(self):
+        """
+            returns the voltage at the OBD socket (AT RV) as a float,
+            or None if the adapter didn't answer. Works without a car,
+            so it can be used to watch for the ignition.
+        """
+        if self.__low_power:
+            self.normal_power()
+
+        r = self.__send(b"AT RV")
+        try:
+            return float(r[0].lower().replace('v', ''))
+        except (IndexError, ValueError):
+            return None
+
     def protocol_name(self):
         return self.__protocol.ELM_NAME
 
@@ -465,6 +588,15 @@ class ELM327:
             self.normal_power()
 
         lines = self.__send(cmd)
+
+        if metrics.enabled:
+            if self.__has_message(lines, "NO DATA"):
+                metrics.count("no_data")
+            start = metrics.start()
+            messages = self.__protocol(lines)
+            metrics.stop("parse", start)
+            return messages
+
         messages = self.__protocol(lines)
         return messages
 
@@ -477,6 +609,7 @@ class ELM327:
             after an optional delay, until the end marker (by
             default, the prompt) is seen
         """
+        start = metrics.start() if metrics.enabled else None
         self.__write(cmd)
 
         delayed = 0.0
@@ -489,9 +622,14 @@ class ELM327:
         while delayed < 1.0 and len(r) <= 0:
             d = 0.1
             logger.debug("no response; wait: %f seconds" % d)
+            if start is not None:
+                metrics.count("retries")
             time.sleep(d)
             delayed += d
             r = self.__read(end_marker=end_marker)
+
+        if start is not None:
+            metrics.stop("serial", start)
         return r
 
     def __write(self, cmd):
@@ -501,7 +639,7 @@ class ELM327:
 
         if self.__port:
             cmd += b"\r"  # terminate with carriage return in accordance with ELM327 and STN11XX specifications
-            logger.debug("write: " + repr(cmd))
+            logger.debug("write: %r", cmd)
             try:
                 self.__port.flushInput()  # dump everything in the input buffer
                 self.__port.write(cmd)  # turn the string into bytes and write
@@ -510,6 +648,8 @@ class ELM327:
                 self.__status = OBDStatus.NOT_CONNECTED
                 self.__port.close()
                 self.__port = None
+                if metrics.enabled:
+                    metrics.count("disconnects")
                 logger.critical("Device disconnected while writing")
                 return
         else:
@@ -537,12 +677,16 @@ class ELM327:
                 self.__status = OBDStatus.NOT_CONNECTED
                 self.__port.close()
                 self.__port = None
+                if metrics.enabled:
+                    metrics.count("disconnects")
                 logger.critical("Device disconnected while reading")
                 return []
 
             # if nothing was received
             if not data:
                 logger.warning("Failed to read port")
+                if metrics.enabled:
+                    metrics.count("timeouts")
                 break
 
             buffer.extend(data)
@@ -552,7 +696,8 @@ class ELM327:
                 break
 
         # log, and remove the "bytearray(   ...   )" part
-        logger.debug("read: " + repr(buffer)[10:-1])
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("read: " + repr(buffer)[10:-1])
 
         # clean out any null characters
         buffer = re.sub(b"\x00", b"", buffer)
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+
+########################################################################
+#                                                                      #
+# python-OBD: A python OBD-II serial module derived from pyobd         #
+#                                                                      #
+# Copyright 2004 Donour Sizemore (donour@uchicago.edu)                 #
+# Copyright 2009 Secons Ltd. (www.obdtester.com)                       #
+# Copyright 2009 Peter J. Creath                                       #
+# Copyright 2016 Brendan Whitfield (brendan-w.com)                     #
+#                                                                      #
+########################################################################
+#                                                                      #
+# history.py                                                           #
+#                                                                      #
+# This file is part of python-OBD (a derivative of pyOBD)              #
+#                                                                      #
+# python-OBD is free software: you can redistribute it and/or modify   #
+# it under the terms of the GNU General Public License as published by #
+# the Free Software Foundation, either version 2 of the License, or    #
+# (at your option) any later version.                                  #
+#                                                                      #
+# python-OBD is distributed in the hope that it will be useful,        #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of       #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the        #
+# GNU General Public License for more details.                         #
+#                                                                      #
+# You should have received a copy of the GNU General Public License    #
+# along with python-OBD.  If not, see <http://www.gnu.org/licenses/>.  #
+#                                                                      #
+########################################################################
+
+import time
+from bisect import bisect_left
+
+from .instrumentation import RingBuffer
+
+"""
+
+Fixed-capacity history of a PID's values
+
+Each watched command of an Async connection can keep its recent
+(timestamp, value) samples in a pair of instrumentation RingBuffers.
+Appends are O(1) and never allocate. Window reads find their start
+with a binary search, and return contiguous arrays, oldest sample first.
+
+    connection = obd.Async(history_size=600)
+    connection.watch(obd.commands.RPM)
+    times, values = connection.history(obd.commands.RPM, seconds=10)
+
+"""
+
+
+class History(object):
+    """ ring of (timestamp, float value) samples """
+
+    def __init__(self, size):
+        self.size = size
+        self.times = RingBuffer(size)
+        self.values = RingBuffer(size)
+
+    def __len__(self):
+        return min(self.times.count, self.size)
+
+    def append(self, timestamp, value):
+        # the value first: readers go by the timestamps' count
+        self.values.add(value)
+        self.times.add(timestamp)
+
+    def window(self, seconds=None, now=None):
+        """
+            returns (timestamps, values) arrays of the samples taken in the
+            last `seconds` before `now` (the current time by default),
+            or of every retained sample when seconds is None
+        """
+        count = self.times.count  # the polling thread may append meanwhile
+        n = min(count, self.size)
+        oldest = 0 if count <= self.size else count % self.size
+        times = self.times.values
+        values = self.values.values
+
+        start = 0
+        if seconds is not None and n > 0:
+            if now is None:
+                now = time.time()  # the clock of OBDResponse.time
+            # timestamps only grow, so the ring read in order is sorted
+            start = bisect_left(_Timestamps(times, oldest, n), now - seconds)
+
+        first = (oldest + start) % self.size
+        last = first + (n - start)
+        if last <= self.size:
+            return times[first:last], values[first:last]
+        last -= self.size
+        return times[first:] + times[:last], values[first:] + values[:last]
+
+    def clear(self):
+        self.times.clear()
+        self.values.clear()
+
+
+class _Timestamps(object):
+    """ sequence view of a ring's timestamps in order, for bisect """
+
+    def __init__(self, times, oldest, n):
+        self.times = times
+        self.oldest = oldest
+        self.n = n
+
+    def __len__(self):
+        return self.n
+
+    def __getitem__(self, n):
+        return self.times[(self.oldest + n) % len(self.times)]
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+
+########################################################################
+#                                                                      #
+# python-OBD: A python OBD-II serial module derived from pyobd         #
+#                                                                      #
+# Copyright 2004 Donour Sizemore (donour@uchicago.edu)                 #
+# Copyright 2009 Secons Ltd. (www.obdtester.com)                       #
+# Copyright 2009 Peter J. Creath                                       #
+# Copyright 2016 Brendan Whitfield (brendan-w.com)                     #
+#                                                                      #
+########################################################################
+#                                                                      #
+# instrumentation.py                                                   #
+#                                                                      #
+# This file is part of python-OBD (a derivative of pyOBD)              #
+#                                                                      #
+# python-OBD is free software: you can redistribute it and/or modify   #
+# it under the terms of the GNU General Public License as published by #
+# the Free Software Foundation, either version 2 of the License, or    #
+# (at your option) any later version.                                  #
+#                                                                      #
+# python-OBD is distributed in the hope that it will be useful,        #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of       #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the        #
+# GNU General Public License for more details.                         #
+#                                                                      #
+# You should have received a copy of the GNU General Public License    #
+# along with python-OBD.  If not, see <http://www.gnu.org/licenses/>.  #
+#                                                                      #
+########################################################################
+
+import time
+from array import array
+
+"""
+
+Low-overhead instrumentation for the query hot path
+
+Call sites check `metrics.enabled` before doing any work, so a disabled
+Metrics object costs one attribute lookup per hook. When enabled, spans
+are timed with the monotonic performance counter and kept in fixed-size
+ring buffers, so memory stays bounded however long the car runs.
+
+    import obd
+    obd.metrics.enable()
+    ...
+    obd.metrics.snapshot()
+
+"""
+
+
+class RingBuffer(object):
+    """ fixed-capacity buffer of the most recent float samples """
+
+    def __init__(self, size):
+        self.size = size
+        self.values = array('d', [0.0] * size)
+        self.count = 0  # total number of samples ever added
+
+    def add(self, value):
+        self.values[self.count % self.size] = value
+        self.count += 1
+
+    def samples(self):
+        """ returns the retained samples, oldest first """
+        if self.count <= self.size:
+            return self.values[:self.count].tolist()
+        i = self.count % self.size
+        return (self.values[i:] + self.values[:i]).tolist()
+
+    def clear(self):
+        self.count = 0
+
+
+def percentile(ordered, p):
+    """ nearest-rank percentile of sorted samples, 0.0 when there are none """
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100.0))]
+
+
+class Metrics(object):
+    """ counters and span histograms, shared by the ELM327, OBD and Async classes """
+
+    def __init__(self, size=256):
+        self.enabled = False
+        self.size = size
+        self.counters = {}
+        self.gauges = {}
+        self.spans = {}
+        self.started = time.time()
+
+    def enable(self, size=None):
+        if size is not None and size != self.size:
+            self.size = size
+            self.spans = {}
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        self.counters = {}
+        self.gauges = {}
+        self.spans = {}
+        self.started = time.time()
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def gauge(self, name, value):
+        """ records the latest value of something that isn't a duration """
+        self.gauges[name] = value
+
+    @staticmethod
+    def start():
+        """ returns a start mark for stop() """
+        return time.perf_counter()
+
+    def stop(self, name, start):
+        """ records the time elapsed since start() under the span name """
+        self.observe(name, time.perf_counter() - start)
+
+    def observe(self, name, value):
+        span = self.spans.get(name)
+        if span is None:
+            span = self.spans[name] = RingBuffer(self.size)
+        span.add(value)
+
+    def snapshot(self):
+        """ returns a JSON-friendly summary of all counters and spans (in ms) """
+        spans = {}
+        for name, span in list(self.spans.items()):
+            ordered = sorted(span.samples())
+            spans[name] = {
+                "count": span.count,
+                "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+                "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+                "max_ms": round(ordered[-1] * 1000, 3) if ordered else 0.0,
+            }
+        return {
+            "uptime": round(time.time() - self.started, 1),
+            "counters": dict(self.counters),
+            "gauges": dict(self.gauges),
+            "spans": spans,
+        }
+
+
+# shared instance used by the library's hooks
+metrics = Metrics()
@@ -37,7 +37,9 @@ from .OBDResponse import OBDResponse
 from .__version__ import __version__
 from .commands import commands
 from .elm327 import ELM327
-from .protocols import ECU_HEADER
+from .socketcan import SocketCAN
+from .instrumentation import metrics
+from .protocols import ECU, ECU_HEADER
 from .utils import scan_serial, OBDStatus
 
 logger = logging.getLogger(__name__)
@@ -50,7 +52,8 @@ class OBD(object):
     """
 
     def __init__(self, portstr=None, baudrate=None, protocol=None, fast=True,
-                 timeout=0.1, check_voltage=True, start_low_power=False):
+                 timeout=0.1, check_voltage=True, start_low_power=False,
+                 link_profile=False, physical_addressing=False):
         self.interface = None
         self.supported_commands = set(commands.base_commands())
         self.fast = fast  # global switch for disabling optimizations
@@ -58,15 +61,24 @@ class OBD(object):
         self.__last_command = b""  # used for running the previous command with a CR
         self.__last_header = ECU_HEADER.ENGINE  # for comparing with the previously used header
         self.__frame_counts = {}  # keeps track of the number of return frames for each command
+        self.__physical_header = None  # header addressing only the engine ECU, when enabled
+        self.__functional_header = None  # header addressing every ECU, when physical addressing is enabled
+        self.header_switches = 0  # number of AT SH round trips sent so far
+        self.__protocol = protocol  # kept for connect_car()
+        self.__link_profile = link_profile
+        self.__physical_addressing = physical_addressing
 
         logger.info("======================= python-OBD (v%s) =======================" % __version__)
         self.__connect(portstr, baudrate, protocol,
-                       check_voltage, start_low_power)  # initialize by connecting and loading sensors
+                       check_voltage, start_low_power,
+                       link_profile)  # initialize by connecting and loading sensors
         self.__load_commands()  # try to load the car's supported commands
+        if physical_addressing:
+            self.__enable_physical_addressing()
         logger.info("===================================================================")
 
     def __connect(self, portstr, baudrate, protocol, check_voltage,
-                  start_low_power):
+                  start_low_power, link_profile):
         """
             Attempts to instantiate an ELM327 connection object.
         """
@@ -84,15 +96,18 @@ class OBD(object):
                 logger.info("Attempting to use port: " + str(port))
                 self.interface = ELM327(port, baudrate, protocol,
                                         self.timeout, check_voltage,
-                                        start_low_power)
+                                        start_low_power, link_profile)
 
                 if self.interface.status() >= OBDStatus.ELM_CONNECTED:
                     break  # success! stop searching for serial
+        elif portstr.startswith(SocketCAN.URL_SCHEME):
+            logger.info("SocketCAN interface defined")
+            self.interface = SocketCAN(portstr, protocol, self.timeout)
         else:
             logger.info("Explicit port defined")
             self.interface = ELM327(portstr, baudrate, protocol,
                                     self.timeout, check_voltage,
-                                    start_low_power)
+                                    start_low_power, link_profile)
 
         # if the connection failed, close it
         if self.interface.status() == OBDStatus.NOT_CONNECTED:
@@ -141,9 +156,89 @@ class OBD(object):
 
         logger.info("finished querying with %d commands supported" % len(self.supported_commands))
 
+    def __enable_physical_addressing(self):
+        """
+            Discovery (0100) goes out as a broadcast. Once the engine ECU is
+            known, engine commands are addressed to it alone (e.g. 7E0 -> 7E8),
+            so the adapter stops listening as soon as it answered, instead of
+            waiting out its timeout for other ECUs. Commands meant for all
+            ECUs (like GET_DTC) keep using the broadcast header.
+        """
+
+        if self.status() != OBDStatus.CAR_CONNECTED:
+            return
+
+        protocol = self.interface.protocol_id()
+        if protocol not in ["6", "7", "8", "9"]:
+            logger.info("Physical addressing is only supported over CAN protocols")
+            return
+
+        engines = [tx_id for tx_id, ecu in self.interface.ecu_map().items()
+                   if ecu == ECU.ENGINE and tx_id is not None]
+        if not engines:
+            logger.info("No engine ECU found, keeping broadcast addressing")
+            return
+
+        if protocol in ["6", "8"]:
+            # responses come from 7E8 + n, requests go to 7E0 + n
+            self.__physical_header = ("7E%X" % engines[0]).encode()
+            self.__functional_header = ECU_HEADER.FUNCTIONAL
+        else:
+            # responses come from 18 DA F1 xx, requests go to 18 DA xx F1
+            self.__physical_header = ("DA%02XF1" % engines[0]).encode()
+            self.__functional_header = ECU_HEADER.FUNCTIONAL_29BIT
+
+        # the adapter is still on its default broadcast header,
+        # and frame counts learned from broadcasts no longer apply
+        self.__last_header = self.__functional_header
+        self.__frame_counts = {}
+        logger.info("Addressing the engine ECU directly with header %s" % self.__physical_header)
+
+    def connect_car(self):
+        """
+            Retries the car on the open adapter, when the connection was made
+            with the ignition off: only the protocol search and the PID
+            discovery run again, the adapter isn't reset. Returns True once
+            the car is connected.
+        """
+
+        if self.status() == OBDStatus.CAR_CONNECTED:
+            return True
+        if self.interface is None or not hasattr(self.interface, "connect_car"):
+            return False  # nothing to retry on, or not an ELM327 (SocketCAN)
+
+        if not self.interface.connect_car(self.__protocol, self.__link_profile):
+            return False
+
+        self.supported_commands = set(commands.base_commands())
+        self.__last_header = ECU_HEADER.ENGINE
+        self.__frame_counts = {}
+        self.__load_commands()
+        if self.__physical_addressing:
+            self.__enable_physical_addressing()
+        return True
+
+    @property
+    def functional_header(self):
+        """ the broadcast header, when physical addressing is enabled (None otherwise) """
+        return self.__functional_header
+
+    def header_for(self, cmd):
+        """ returns the header to send the given command with """
+        if self.__physical_header is None or cmd.header != ECU_HEADER.ENGINE:
+            return cmd.header
+        if cmd.mode is None:
+            return self.__last_header  # adapter commands (AT RV...) don't care
+        if cmd.ecu == ECU.ENGINE:
+            return self.__physical_header
+        return self.__functional_header
+
     def __set_header(self, header):
         if header == self.__last_header:
             return
+        self.header_switches += 1
+        if metrics.enabled:
+            metrics.count("header_switches")
         r = self.interface.send_and_parse(b'AT SH ' + header + b' ')
         if not r:
             logger.info("Set Header ('AT SH %s') did not return data", header)
@@ -274,9 +369,9 @@ class OBD(object):
         if not force and not self.test_cmd(cmd):
             return OBDResponse()
 
-        self.__set_header(cmd.header)
+        self.__set_header(self.header_for(cmd))
 
-        logger.info("Sending command: %s" % str(cmd))
+        logger.info("Sending command: %s", cmd)  # lazy, formatted only when logged
         cmd_string = self.__build_command_string(cmd)
         messages = self.interface.send_and_parse(cmd_string)
 
@@ -295,6 +390,12 @@ class OBD(object):
             logger.info("No valid OBD Messages returned")
             return OBDResponse()
 
+        if metrics.enabled:
+            start = metrics.start()
+            r = cmd(messages)
+            metrics.stop("decode", start)
+            return r
+
         return cmd(messages)  # compute a response object
 
     def __build_command_string(self, cmd):
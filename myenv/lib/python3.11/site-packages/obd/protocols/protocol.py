@@ -47,6 +47,8 @@ Basic data models for all protocols to use
 class ECU_HEADER:
     """ Values for the ECU headers """
     ENGINE = b'7E0'
+    FUNCTIONAL = b'7DF'  # broadcast to all ECUs (CAN 11-bit)
+    FUNCTIONAL_29BIT = b'DB33F1'  # broadcast to all ECUs (CAN 29-bit)
 
 
 class ECU:
@@ -134,6 +136,13 @@ class Protocol(object):
     TX_ID_ENGINE = None
     TX_ID_TRANSMISSION = None
 
+    # ELM status messages, keyed by how they read with spaces off (ATS0)
+    ELM_MESSAGES = dict((m.replace(" ", ""), m) for m in [
+        "NO DATA", "CAN ERROR", "BUS INIT", "BUS BUSY", "BUS ERROR",
+        "DATA ERROR", "UNABLE TO CONNECT", "BUFFER FULL", "FB ERROR",
+        "LV RESET", "ACT ALERT", "STOPPED", "RX ERROR",
+    ])
+
     def __init__(self, lines_0100):
         """
             constructs a protocol object
@@ -188,7 +197,9 @@ class Protocol(object):
             if isHex(line_no_spaces):
                 obd_lines.append(line_no_spaces)
             else:
-                non_obd_lines.append(line)  # pass the original, un-scrubbed line
+                # pass the original, un-scrubbed line, with the spaces
+                # restored if it's a status message squashed by ATS0
+                non_obd_lines.append(self.ELM_MESSAGES.get(line_no_spaces, line))
 
         # ---------------------- handle valid OBD lines ----------------------
 
@@ -288,6 +288,8 @@ class ISO_15765_4_11bit_500k(CANProtocol):
 class ISO_15765_4_29bit_500k(CANProtocol):
     ELM_NAME = "ISO 15765-4 (CAN 29/500)"
     ELM_ID = "7"
+    TX_ID_ENGINE = 0x10  # 18 DA F1 10
+    TX_ID_TRANSMISSION = 0x18  # 18 DA F1 18
 
     def __init__(self, lines_0100):
         CANProtocol.__init__(self, lines_0100, id_bits=29)
@@ -304,6 +306,8 @@ class ISO_15765_4_11bit_250k(CANProtocol):
 class ISO_15765_4_29bit_250k(CANProtocol):
     ELM_NAME = "ISO 15765-4 (CAN 29/250)"
     ELM_ID = "9"
+    TX_ID_ENGINE = 0x10  # 18 DA F1 10
+    TX_ID_TRANSMISSION = 0x18  # 18 DA F1 18
 
     def __init__(self, lines_0100):
         CANProtocol.__init__(self, lines_0100, id_bits=29)
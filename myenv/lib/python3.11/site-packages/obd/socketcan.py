@@ -0,0 +1,333 @@
+# -*- coding: utf-8 -*-
+
+########################################################################
+#                                                                      #
+# python-OBD: A python OBD-II serial module derived from pyobd         #
+#                                                                      #
+# Copyright 2004 Donour Sizemore (donour@uchicago.edu)                 #
+# Copyright 2009 Secons Ltd. (www.obdtester.com)                       #
+# Copyright 2009 Peter J. Creath                                       #
+# Copyright 2016 Brendan Whitfield (brendan-w.com)                     #
+#                                                                      #
+########################################################################
+#                                                                      #
+# socketcan.py                                                         #
+#                                                                      #
+# This file is part of python-OBD (a derivative of pyOBD)              #
+#                                                                      #
+# python-OBD is free software: you can redistribute it and/or modify   #
+# it under the terms of the GNU General Public License as published by #
+# the Free Software Foundation, either version 2 of the License, or    #
+# (at your option) any later version.                                  #
+#                                                                      #
+# python-OBD is distributed in the hope that it will be useful,        #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of       #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the        #
+# GNU General Public License for more details.                         #
+#                                                                      #
+# You should have received a copy of the GNU General Public License    #
+# along with python-OBD.  If not, see <http://www.gnu.org/licenses/>.  #
+#                                                                      #
+########################################################################
+
+import logging
+import socket
+import struct
+import time
+
+from .protocols import *
+from .protocols.protocol import Frame, Message
+from .utils import OBDStatus
+from .instrumentation import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class SocketCAN:
+    """
+        Talks to the car directly over a Linux SocketCAN interface
+        (a CAN HAT, or vcan for testing), bypassing the ELM327.
+
+        Offers the same functions as the ELM327 class, so OBD() can use
+        either one. Requests go out as ISO-TP single frames, responses are
+        collected (sending flow control for multi-frame answers), then
+        handed to the regular CANProtocol parsers as ELM-style lines.
+
+        Selected by OBD() with a port name of the form: socketcan://can0
+    """
+
+    URL_SCHEME = "socketcan://"
+
+    _SUPPORTED_PROTOCOLS = {
+        "6": ISO_15765_4_11bit_500k,
+        "7": ISO_15765_4_29bit_500k,
+        "8": ISO_15765_4_11bit_250k,
+        "9": ISO_15765_4_29bit_250k,
+    }
+
+    # struct can_frame: id, dlc, 3 bytes padding, 8 bytes of data
+    _CAN_FRAME = struct.Struct("=IB3x8s")
+
+    FUNCTIONAL_11BIT = 0x7DF
+    FUNCTIONAL_29BIT = 0x18DB33F1
+    PADDING = 0x00
+
+    def __init__(self, portname, protocol=None, timeout=0.1):
+        """ Opens the CAN interface and probes the car with 0100 """
+
+        self.__channel = portname[len(self.URL_SCHEME):] if portname.startswith(self.URL_SCHEME) else portname
+        self.__status = OBDStatus.NOT_CONNECTED
+        self.__socket = None
+        self.__protocol = UnknownProtocol([])
+        self.__last_command = b""
+        self.timeout = timeout
+
+        protocol = "6" if protocol is None else protocol
+        if protocol not in self._SUPPORTED_PROTOCOLS:
+            logger.error("SocketCAN only supports the CAN protocols (\"6\" through \"9\"), not %s" % protocol)
+            return
+        self.__protocol_id = protocol
+        self.__id_bits = 29 if protocol in ("7", "9") else 11
+        self.__functional_id = self.FUNCTIONAL_29BIT if self.__id_bits == 29 else self.FUNCTIONAL_11BIT
+        self.__tx_id = self.__functional_id
+
+        logger.info("Initializing SocketCAN: CHANNEL=%s PROTOCOL=%s" % (self.__channel, protocol))
+
+        try:
+            self.__socket = self._open_socket(self.__channel)
+        except OSError as e:
+            logger.error("Failed to open %s: %s" % (self.__channel, e))
+            return
+
+        # the interface is up, but we haven't heard from the car yet
+        self.__status = OBDStatus.ELM_CONNECTED
+
+        r0100 = self.__request(b"0100")
+        if "NO DATA" in r0100:
+            logger.error("Connected to %s, but the car did not answer 0100" % self.__channel)
+            return
+
+        self.__protocol = self._SUPPORTED_PROTOCOLS[protocol](r0100)
+        self.__status = OBDStatus.CAR_CONNECTED
+        if metrics.enabled:
+            metrics.count("connects")
+        logger.info("Connected Successfully: CHANNEL=%s PROTOCOL=%s" % (self.__channel, protocol))
+
+    def _open_socket(self, channel):
+        """ opens a raw CAN socket that only receives ECU responses """
+        s = socket.socket(socket.AF_CAN, socket.SOCK_RAW, socket.CAN_RAW)
+        if self.__id_bits == 11:
+            # 0x7E8 - 0x7EF
+            can_filter = struct.pack("=II", 0x7E8, 0x7F8)
+        else:
+            # 0x18DAF1xx, extended frames only
+            can_filter = struct.pack("=II", 0x18DAF100 | socket.CAN_EFF_FLAG,
+                                     0x1FFFFF00 | socket.CAN_EFF_FLAG)
+        s.setsockopt(socket.SOL_CAN_RAW, socket.CAN_RAW_FILTER, can_filter)
+        s.bind((channel,))
+        return s
+
+    def port_name(self):
+        return self.URL_SCHEME + self.__channel
+
+    def status(self):
+        return self.__status
+
+    def ecus(self):
+        return self.__protocol.ecu_map.values()
+
+    def ecu_map(self):
+        """ returns {tx_id: ECU} as discovered from the 0100 responses """
+        return dict(self.__protocol.ecu_map)
+
+    def read_voltage(self):
+        """ the CAN bus doesn't carry the supply voltage """
+        return None
+
+    def protocol_name(self):
+        return self.__protocol.ELM_NAME
+
+    def protocol_id(self):
+        return self.__protocol.ELM_ID
+
+    def low_power(self):
+        logger.info("low power mode is an ELM327 feature, not available over SocketCAN")
+        return None
+
+    def normal_power(self):
+        return None
+
+    def close(self):
+        self.__status = OBDStatus.NOT_CONNECTED
+        self.__protocol = None
+
+        if self.__socket is not None:
+            logger.info("closing CAN socket")
+            self.__socket.close()
+            self.__socket = None
+
+    def send_and_parse(self, cmd):
+        """
+            Same contract as ELM327.send_and_parse(): sends the command string
+            (an empty string repeats the previous one) and returns a list of
+            Message objects parsed by the protocol.
+        """
+
+        if self.__status == OBDStatus.NOT_CONNECTED:
+            logger.info("cannot send_and_parse() when unconnected")
+            return None
+
+        command = cmd.replace(b" ", b"").upper()
+        if command.startswith(b"AT"):
+            return self.__at_command(command[2:])
+
+        lines = self.__request(cmd)
+
+        if metrics.enabled:
+            if "NO DATA" in lines:
+                metrics.count("no_data")
+            start = metrics.start()
+            messages = self.__protocol(lines)
+            metrics.stop("parse", start)
+            return messages
+
+        messages = self.__protocol(lines)
+        return messages
+
+    def __at_command(self, at):
+        """ emulates the few adapter commands python-OBD sends outside of OBD requests """
+        if at.startswith(b"SH"):
+            header = int(at[2:], 16)
+            if self.__id_bits == 29:
+                header |= 0x18000000  # ATSH only sets the low 24 bits, priority stays 0x18
+            self.__tx_id = header
+            return [Message([Frame("OK")])]
+
+        # ATRV and friends need an adapter, there's nothing to answer them
+        logger.info("'AT%s' is not available over SocketCAN" % at.decode())
+        return []
+
+    def __request(self, cmd):
+        """
+            sends one OBD request, and returns the response frames as
+            ELM-style hex lines (or ["NO DATA"] if nobody answered)
+        """
+        if not cmd:
+            cmd = self.__last_command  # an empty command repeats the last one
+        self.__last_command = cmd
+
+        # a trailing odd digit is the ELM's "number of responses" hint
+        expected = 0
+        if len(cmd) % 2:
+            expected = int(cmd[-1:], 16)
+            cmd = cmd[:-1]
+
+        payload = bytearray.fromhex(cmd.decode())
+        if len(payload) > 7:
+            logger.warning("Requests longer than a single frame aren't supported")
+            return ["NO DATA"]
+
+        start = metrics.start() if metrics.enabled else None
+        self.__send_frame(self.__tx_id, bytes([len(payload)]) + bytes(payload))
+        lines = self.__receive(expected, physical=(self.__tx_id != self.__functional_id))
+        if start is not None:
+            metrics.stop("serial", start)
+
+        return lines if lines else ["NO DATA"]
+
+    def __receive(self, expected, physical):
+        """
+            collects response frames until the expected number of frames
+            arrived, the addressed ECU finished its answer, or the bus went
+            quiet for `timeout` seconds.
+        """
+        lines = []
+        remaining = {}  # can_id -> bytes still expected for a multi-frame answer
+        complete = 0
+        deadline = time.monotonic() + self.timeout
+
+        while True:
+            wait = deadline - time.monotonic()
+            if wait <= 0:
+                if metrics.enabled and not lines:
+                    metrics.count("timeouts")
+                break
+
+            frame = self.__recv_frame(wait)
+            if frame is None:
+                continue
+            can_id, data = frame
+            lines.append(self.__format(can_id, data))
+
+            pci = data[0] & 0xF0
+            if pci == 0x00:
+                complete += 1
+            elif pci == 0x10:
+                remaining[can_id] = (((data[0] & 0x0F) << 8) | data[1]) - 6
+                self.__send_flow_control(can_id)
+            elif pci == 0x20 and can_id in remaining:
+                remaining[can_id] -= 7
+                if remaining[can_id] <= 0:
+                    del remaining[can_id]
+                    complete += 1
+
+            # give the ECUs another timeout window after every frame
+            deadline = time.monotonic() + self.timeout
+
+            if not remaining:
+                if expected and len(lines) >= expected:
+                    break
+                if physical and complete:
+                    break  # only the addressed ECU answers
+
+        return lines
+
+    def __send_flow_control(self, can_id):
+        """ tells the ECU to send the rest of its frames, without delays """
+        if self.__id_bits == 11:
+            tx_id = can_id - 8
+        else:
+            tx_id = 0x18DA00F1 | ((can_id & 0xFF) << 8)
+        self.__send_frame(tx_id, b"\x30\x00\x00")
+
+    def __send_frame(self, can_id, data):
+        if self.__id_bits == 29:
+            can_id |= socket.CAN_EFF_FLAG
+        data = data.ljust(8, bytes([self.PADDING]))
+        try:
+            self.__socket.send(self._CAN_FRAME.pack(can_id, len(data), data))
+        except OSError as e:
+            self.__disconnected("writing", e)
+
+    def __recv_frame(self, timeout):
+        """ returns (can_id, data) or None on timeout """
+        if self.__socket is None:
+            return None
+        try:
+            self.__socket.settimeout(timeout)
+            raw = self.__socket.recv(self._CAN_FRAME.size)
+        except socket.timeout:
+            return None
+        except OSError as e:
+            self.__disconnected("reading", e)
+            return None
+
+        if len(raw) != self._CAN_FRAME.size:
+            return None  # not a classic CAN frame
+
+        can_id, dlc, data = self._CAN_FRAME.unpack(raw)
+        return can_id & socket.CAN_EFF_MASK, data[:dlc]
+
+    def __format(self, can_id, data):
+        """ renders a frame the way the ELM327 prints it with headers on, spaces off """
+        header = ("%03X" if self.__id_bits == 11 else "%08X") % can_id
+        return header + data.hex().upper()
+
+    def __disconnected(self, action, e):
+        self.__status = OBDStatus.NOT_CONNECTED
+        if self.__socket is not None:
+            self.__socket.close()
+            self.__socket = None
+        if metrics.enabled:
+            metrics.count("disconnects")
+        logger.critical("CAN interface went away while %s: %s" % (action, e))
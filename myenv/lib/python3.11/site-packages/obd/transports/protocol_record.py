@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+
+########################################################################
+#                                                                      #
+# python-OBD: A python OBD-II serial module derived from pyobd         #
+#                                                                      #
+# Copyright 2004 Donour Sizemore (donour@uchicago.edu)                 #
+# Copyright 2009 Secons Ltd. (www.obdtester.com)                       #
+# Copyright 2009 Peter J. Creath                                       #
+# Copyright 2016 Brendan Whitfield (brendan-w.com)                     #
+#                                                                      #
+########################################################################
+#                                                                      #
+# transports/protocol_record.py                                        #
+#                                                                      #
+# This file is part of python-OBD (a derivative of pyOBD)              #
+#                                                                      #
+# python-OBD is free software: you can redistribute it and/or modify   #
+# it under the terms of the GNU General Public License as published by #
+# the Free Software Foundation, either version 2 of the License, or    #
+# (at your option) any later version.                                  #
+#                                                                      #
+# python-OBD is distributed in the hope that it will be useful,        #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of       #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the        #
+# GNU General Public License for more details.                         #
+#                                                                      #
+# You should have received a copy of the GNU General Public License    #
+# along with python-OBD.  If not, see <http://www.gnu.org/licenses/>.  #
+#                                                                      #
+########################################################################
+
+import logging
+
+try:
+    import urlparse
+except ImportError:
+    import urllib.parse as urlparse
+
+import serial
+from serial.serialutil import SerialBase, SerialException, PortNotOpenError
+
+from .session import SessionWriter, WRITE, READ
+
+logger = logging.getLogger(__name__)
+
+
+class Serial(SerialBase):
+    """
+        Wraps a real port, logging every byte written and read
+        to a session file that replay:// can play back.
+
+        URL format: record://<port>?file=<session log>
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.__port = None
+        self.__writer = None
+        super(Serial, self).__init__(*args, **kwargs)
+
+    def open(self):
+        if self.is_open:
+            raise SerialException("Port is already open.")
+        if self._port is None:
+            raise SerialException("Port must be configured before it can be used.")
+
+        port, path = self.from_url(self._port)
+        self.__port = serial.serial_for_url(port,
+                                            baudrate=self._baudrate,
+                                            parity=self._parity,
+                                            stopbits=self._stopbits,
+                                            bytesize=self._bytesize,
+                                            timeout=self._timeout)
+        self.__writer = SessionWriter(path)
+        logger.info("Recording session on %s to %s" % (port, path))
+        self.is_open = True
+
+    def from_url(self, url):
+        """ returns (inner port name, session log path) """
+        parts = urlparse.urlsplit(url)
+        if parts.scheme != "record":
+            raise SerialException("expected a string in the form "
+                                  "\"record://<port>?file=<path>\": not starting "
+                                  "with record:// (%r)" % parts.scheme)
+        options = urlparse.parse_qs(parts.query)
+        if "file" not in options:
+            raise SerialException("record:// needs a ?file=<path> option")
+        return parts.netloc + parts.path, options["file"][0]
+
+    def close(self):
+        if self.__writer is not None:
+            self.__writer.close()
+            self.__writer = None
+        if self.__port is not None:
+            self.__port.close()
+            self.__port = None
+        self.is_open = False
+
+    def _reconfigure_port(self):
+        # ELM327.auto_baudrate() changes these on the fly
+        if self.__port is not None:
+            self.__port.baudrate = self._baudrate
+            self.__port.timeout = self._timeout
+
+    @property
+    def in_waiting(self):
+        if not self.is_open:
+            raise PortNotOpenError()
+        return self.__port.in_waiting
+
+    def read(self, size=1):
+        if not self.is_open:
+            raise PortNotOpenError()
+        data = self.__port.read(size)
+        self.__writer.record(READ, data)
+        return data
+
+    def write(self, data):
+        if not self.is_open:
+            raise PortNotOpenError()
+        self.__writer.record(WRITE, data)
+        return self.__port.write(data)
+
+    def flush(self):
+        if self.is_open:
+            self.__port.flush()
+
+    def reset_input_buffer(self):
+        if not self.is_open:
+            raise PortNotOpenError()
+        self.__port.reset_input_buffer()
+
+    def reset_output_buffer(self):
+        if not self.is_open:
+            raise PortNotOpenError()
+        self.__port.reset_output_buffer()
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+
+########################################################################
+#                                                                      #
+# python-OBD: A python OBD-II serial module derived from pyobd         #
+#                                                                      #
+# Copyright 2004 Donour Sizemore (donour@uchicago.edu)                 #
+# Copyright 2009 Secons Ltd. (www.obdtester.com)                       #
+# Copyright 2009 Peter J. Creath                                       #
+# Copyright 2016 Brendan Whitfield (brendan-w.com)                     #
+#                                                                      #
+########################################################################
+#                                                                      #
+# transports/protocol_replay.py                                        #
+#                                                                      #
+# This file is part of python-OBD (a derivative of pyOBD)              #
+#                                                                      #
+# python-OBD is free software: you can redistribute it and/or modify   #
+# it under the terms of the GNU General Public License as published by #
+# the Free Software Foundation, either version 2 of the License, or    #
+# (at your option) any later version.                                  #
+#                                                                      #
+# python-OBD is distributed in the hope that it will be useful,        #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of       #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the        #
+# GNU General Public License for more details.                         #
+#                                                                      #
+# You should have received a copy of the GNU General Public License    #
+# along with python-OBD.  If not, see <http://www.gnu.org/licenses/>.  #
+#                                                                      #
+########################################################################
+
+import logging
+import threading
+import time
+
+try:
+    import urlparse
+except ImportError:
+    import urllib.parse as urlparse
+
+from serial.serialutil import SerialBase, SerialException, PortNotOpenError
+
+from .session import read_session
+
+logger = logging.getLogger(__name__)
+
+
+class Serial(SerialBase):
+    """
+        Plays back a session log recorded with record://
+
+        Every write is matched against the recorded requests (in order,
+        searching forward when the caller skips ahead), and the recorded
+        response chunks are released with their original timing, scaled
+        by the speed option. speed=0 replays as fast as possible.
+        Requests that were never recorded are answered with '?', just
+        like the ELM327 does for commands it doesn't know.
+
+        URL format: replay://<session log>[?speed=<factor>][&loop=1]
+    """
+
+    UNKNOWN_RESPONSE = b"?\r\r>"
+
+    def __init__(self, *args, **kwargs):
+        self.speed = 1.0
+        self.loop = False
+        self.__exchanges = []
+        self.__cursor = 0
+        self.__pending = []  # list of (due time, bytes)
+        self.__buffer = bytearray()
+        self.__lock = threading.Lock()
+        super(Serial, self).__init__(*args, **kwargs)
+
+    def open(self):
+        if self.is_open:
+            raise SerialException("Port is already open.")
+        if self._port is None:
+            raise SerialException("Port must be configured before it can be used.")
+
+        path = self.from_url(self._port)
+        try:
+            started, self.__exchanges = read_session(path)
+        except (OSError, ValueError) as e:
+            raise SerialException(str(e))
+
+        logger.info("Replaying %d recorded requests from %s (speed=%s)" %
+                    (len(self.__exchanges), path, self.speed or "max"))
+        self.__cursor = 0
+        self.is_open = True
+
+    def from_url(self, url):
+        """ applies the URL options, and returns the session log path """
+        parts = urlparse.urlsplit(url)
+        if parts.scheme != "replay":
+            raise SerialException("expected a string in the form "
+                                  "\"replay://<path>[?speed=<factor>][&loop=1]\": not starting "
+                                  "with replay:// (%r)" % parts.scheme)
+        for option, values in urlparse.parse_qs(parts.query).items():
+            if option == "speed":
+                self.speed = float(values[0])
+            elif option == "loop":
+                self.loop = values[0] not in ("0", "false", "no")
+            else:
+                raise SerialException("unknown option: %r" % option)
+        return parts.netloc + parts.path
+
+    def close(self):
+        self.is_open = False
+        with self.__lock:
+            self.__pending = []
+            self.__buffer = bytearray()
+
+    def _reconfigure_port(self):
+        pass  # nothing to configure
+
+    def __find(self, request):
+        """ index of the next recorded exchange for this request, or None """
+        n = len(self.__exchanges)
+        stop = n if not self.loop else self.__cursor + n
+        for i in range(self.__cursor, stop):
+            if self.__exchanges[i % n].request == request:
+                return i % n
+        return None
+
+    def write(self, data):
+        if not self.is_open:
+            raise PortNotOpenError()
+        data = bytes(data)
+        now = time.monotonic()
+
+        with self.__lock:
+            i = self.__find(data)
+            if i is None:
+                logger.debug("replay: %r was not recorded" % data)
+                self.__pending.append((now, self.UNKNOWN_RESPONSE))
+            else:
+                self.__cursor = i + 1
+                for offset, chunk in self.__exchanges[i].chunks:
+                    due = now + (offset / self.speed if self.speed > 0 else 0)
+                    self.__pending.append((due, chunk))
+        return len(data)
+
+    def __release(self):
+        """ moves the chunks that are due into the input buffer """
+        now = time.monotonic()
+        while self.__pending and self.__pending[0][0] <= now:
+            self.__buffer.extend(self.__pending.pop(0)[1])
+
+    @property
+    def in_waiting(self):
+        if not self.is_open:
+            raise PortNotOpenError()
+        with self.__lock:
+            self.__release()
+            return len(self.__buffer)
+
+    def read(self, size=1):
+        if not self.is_open:
+            raise PortNotOpenError()
+
+        deadline = None if self._timeout is None else time.monotonic() + self._timeout
+        while True:
+            with self.__lock:
+                self.__release()
+                if self.__buffer:
+                    data = bytes(self.__buffer[:size])
+                    del self.__buffer[:size]
+                    return data
+                if not self.__pending:
+                    return b""  # nothing else was recorded for this request
+                wait = self.__pending[0][0] - time.monotonic()
+
+            if deadline is not None:
+                wait = min(wait, deadline - time.monotonic())
+                if wait <= 0:
+                    return b""
+            time.sleep(max(wait, 0))
+
+    def flush(self):
+        pass
+
+    def reset_input_buffer(self):
+        if not self.is_open:
+            raise PortNotOpenError()
+        with self.__lock:
+            # drop late chunks too, so they can't leak into the next response
+            self.__pending = []
+            self.__buffer = bytearray()
+
+    def reset_output_buffer(self):
+        if not self.is_open:
+            raise PortNotOpenError()
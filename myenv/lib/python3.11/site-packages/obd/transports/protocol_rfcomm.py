@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+
+########################################################################
+#                                                                      #
+# python-OBD: A python OBD-II serial module derived from pyobd         #
+#                                                                      #
+# Copyright 2004 Donour Sizemore (donour@uchicago.edu)                 #
+# Copyright 2009 Secons Ltd. (www.obdtester.com)                       #
+# Copyright 2009 Peter J. Creath                                       #
+# Copyright 2016 Brendan Whitfield (brendan-w.com)                     #
+#                                                                      #
+########################################################################
+#                                                                      #
+# transports/protocol_rfcomm.py                                        #
+#                                                                      #
+# This file is part of python-OBD (a derivative of pyOBD)              #
+#                                                                      #
+# python-OBD is free software: you can redistribute it and/or modify   #
+# it under the terms of the GNU General Public License as published by #
+# the Free Software Foundation, either version 2 of the License, or    #
+# (at your option) any later version.                                  #
+#                                                                      #
+# python-OBD is distributed in the hope that it will be useful,        #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of       #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the        #
+# GNU General Public License for more details.                         #
+#                                                                      #
+# You should have received a copy of the GNU General Public License    #
+# along with python-OBD.  If not, see <http://www.gnu.org/licenses/>.  #
+#                                                                      #
+########################################################################
+
+import errno
+import fcntl
+import logging
+import select
+import socket
+import struct
+import termios
+import time
+
+try:
+    import urlparse
+except ImportError:
+    import urllib.parse as urlparse
+
+from serial.serialutil import SerialBase, SerialException, PortNotOpenError
+
+logger = logging.getLogger(__name__)
+
+
+class Serial(SerialBase):
+    """
+        Bluetooth RFCOMM stream socket, straight to the adapter.
+
+        Replaces binding /dev/rfcomm0 with the rfcomm tool: no subprocess at
+        startup, and no tty line discipline on every round trip. The socket
+        is non-blocking, reads wait on select() up to the port timeout.
+
+        URL format: rfcomm://<adapter MAC>[?channel=<n>]
+    """
+
+    CONNECT_TIMEOUT = 10  # seconds
+
+    def __init__(self, *args, **kwargs):
+        self.__socket = None
+        self.channel = 1
+        super(Serial, self).__init__(*args, **kwargs)
+
+    def open(self):
+        if self.is_open:
+            raise SerialException("Port is already open.")
+        if self._port is None:
+            raise SerialException("Port must be configured before it can be used.")
+
+        address = self.from_url(self._port)
+        try:
+            self.__socket = self._connect(address, self.channel)
+        except OSError as e:
+            self.__socket = None
+            raise SerialException("Could not open RFCOMM channel %d on %s: %s" % (self.channel, address, e))
+
+        self.__socket.setblocking(False)
+        self.is_open = True
+
+    def _connect(self, address, channel):
+        """ returns a connected stream socket (replaced by a socketpair in tests) """
+        s = socket.socket(socket.AF_BLUETOOTH, socket.SOCK_STREAM, socket.BTPROTO_RFCOMM)
+        s.settimeout(self.CONNECT_TIMEOUT)
+        s.connect((address, channel))
+        return s
+
+    def from_url(self, url):
+        """ applies the URL options, and returns the adapter address """
+        parts = urlparse.urlsplit(url)
+        if parts.scheme != "rfcomm":
+            raise SerialException("expected a string in the form "
+                                  "\"rfcomm://<MAC>[?channel=<n>]\": not starting "
+                                  "with rfcomm:// (%r)" % parts.scheme)
+        for option, values in urlparse.parse_qs(parts.query).items():
+            if option == "channel":
+                self.channel = int(values[0])
+            else:
+                raise SerialException("unknown option: %r" % option)
+        return parts.netloc.upper()
+
+    def close(self):
+        if self.__socket is not None:
+            try:
+                self.__socket.close()
+            except OSError:
+                pass
+            self.__socket = None
+        self.is_open = False
+
+    def _reconfigure_port(self):
+        pass  # baud rate and framing don't exist on an RFCOMM socket
+
+    @property
+    def in_waiting(self):
+        if not self.is_open:
+            raise PortNotOpenError()
+        try:
+            buf = fcntl.ioctl(self.__socket.fileno(), termios.FIONREAD, b"\0\0\0\0")
+            return struct.unpack("I", buf)[0]
+        except OSError:
+            readable, _, _ = select.select([self.__socket], [], [], 0)
+            return 1 if readable else 0
+
+    def read(self, size=1):
+        if not self.is_open:
+            raise PortNotOpenError()
+
+        data = bytearray()
+        deadline = None if self._timeout is None else time.monotonic() + self._timeout
+        while len(data) < size:
+            wait = None if deadline is None else max(deadline - time.monotonic(), 0)
+            readable, _, _ = select.select([self.__socket], [], [], wait)
+            if not readable:
+                break  # timeout
+            try:
+                chunk = self.__socket.recv(size - len(data))
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                    continue
+                raise SerialException("read failed: %s" % e)
+            if not chunk:
+                raise SerialException("adapter closed the RFCOMM connection")
+            data.extend(chunk)
+        return bytes(data)
+
+    def write(self, data):
+        if not self.is_open:
+            raise PortNotOpenError()
+
+        view = memoryview(bytes(data))
+        while view:
+            _, writable, _ = select.select([], [self.__socket], [], self._write_timeout)
+            if not writable:
+                raise SerialException("write timeout")
+            try:
+                sent = self.__socket.send(view)
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                    continue
+                raise SerialException("write failed: %s" % e)
+            view = view[sent:]
+        return len(data)
+
+    def flush(self):
+        pass  # send() hands everything to the kernel
+
+    def reset_input_buffer(self):
+        if not self.is_open:
+            raise PortNotOpenError()
+        while True:
+            try:
+                if not self.__socket.recv(1024):
+                    break
+            except OSError:
+                break  # nothing left (EAGAIN)
+
+    def reset_output_buffer(self):
+        if not self.is_open:
+            raise PortNotOpenError()
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+
+########################################################################
+#                                                                      #
+# python-OBD: A python OBD-II serial module derived from pyobd         #
+#                                                                      #
+# Copyright 2004 Donour Sizemore (donour@uchicago.edu)                 #
+# Copyright 2009 Secons Ltd. (www.obdtester.com)                       #
+# Copyright 2009 Peter J. Creath                                       #
+# Copyright 2016 Brendan Whitfield (brendan-w.com)                     #
+#                                                                      #
+########################################################################
+#                                                                      #
+# transports/session.py                                                #
+#                                                                      #
+# This file is part of python-OBD (a derivative of pyOBD)              #
+#                                                                      #
+# python-OBD is free software: you can redistribute it and/or modify   #
+# it under the terms of the GNU General Public License as published by #
+# the Free Software Foundation, either version 2 of the License, or    #
+# (at your option) any later version.                                  #
+#                                                                      #
+# python-OBD is distributed in the hope that it will be useful,        #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of       #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the        #
+# GNU General Public License for more details.                         #
+#                                                                      #
+# You should have received a copy of the GNU General Public License    #
+# along with python-OBD.  If not, see <http://www.gnu.org/licenses/>.  #
+#                                                                      #
+########################################################################
+
+import struct
+import time
+
+"""
+
+Compact, timestamped log of the raw bytes exchanged with an adapter
+
+    header:  MAGIC, then the wall-clock start time (float64)
+    records: direction (uint8), microseconds since the previous
+             record (uint32), length (uint16), followed by the bytes
+
+"""
+
+MAGIC = b"OBDSESS1"
+WRITE = 0
+READ = 1
+
+_HEADER = struct.Struct("<d")
+_RECORD = struct.Struct("<BIH")
+_MAX_DELTA = 0xFFFFFFFF
+
+
+class SessionWriter(object):
+    """ Appends write/read records to a session log """
+
+    def __init__(self, path):
+        self.__file = open(path, "wb")
+        self.__file.write(MAGIC + _HEADER.pack(time.time()))
+        self.__last = time.monotonic()
+
+    def record(self, direction, data):
+        if not data or self.__file is None:
+            return
+        now = time.monotonic()
+        delta = min(int((now - self.__last) * 1e6), _MAX_DELTA)
+        self.__last = now
+        self.__file.write(_RECORD.pack(direction, delta, len(data)) + bytes(data))
+
+    def close(self):
+        if self.__file is not None:
+            self.__file.close()
+            self.__file = None
+
+
+class Exchange(object):
+    """ one request written to the adapter, and the chunks read back after it """
+
+    def __init__(self, request, time_):
+        self.request = request
+        self.time = time_
+        self.chunks = []  # list of (seconds after the request, bytes)
+
+
+def read_session(path):
+    """
+        Loads a session log.
+        Returns (start time, list of Exchange objects)
+    """
+
+    with open(path, "rb") as f:
+        data = f.read()
+
+    if not data.startswith(MAGIC):
+        raise ValueError("%s is not an OBD session log" % path)
+
+    offset = len(MAGIC)
+    started, = _HEADER.unpack_from(data, offset)
+    offset += _HEADER.size
+
+    exchanges = []
+    t = 0.0
+    while offset + _RECORD.size <= len(data):
+        direction, delta, length = _RECORD.unpack_from(data, offset)
+        offset += _RECORD.size
+        payload = data[offset:offset + length]
+        offset += length
+        t += delta / 1e6
+
+        if direction == WRITE:
+            exchanges.append(Exchange(payload, t))
+        elif exchanges:
+            exchange = exchanges[-1]
+            exchange.chunks.append((t - exchange.time, payload))
+        # reads before the first write are noise from a previous session
+
+    return started, exchanges
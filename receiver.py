@@ -0,0 +1,57 @@
+import argparse
+import asyncio
+import random
+
+from obd.instrumentation import percentile
+
+from uplink import LiveReceiver
+
+# === Receiver Configuration ===
+DEFAULT_PORT = 9999
+REPORT_INTERVAL = 1.0  # seconds between printed reports
+
+
+class LossyReceiver(LiveReceiver):
+    """ Drops a share of the datagrams on arrival, to see the live view on a lossy link """
+
+    def __init__(self, loss, on_value=None):
+        super().__init__(on_value)
+        self.loss = loss
+
+    def datagram_received(self, data, address):
+        if random.random() >= self.loss:
+            super().datagram_received(data, address)
+
+
+async def run(host, port, loss):
+    loop = asyncio.get_running_loop()
+    transport, receiver = await loop.create_datagram_endpoint(
+        lambda: LossyReceiver(loss), local_addr=(host, port))
+    print(f"Listening for live datagrams on {host}:{port}")
+    try:
+        while True:
+            await asyncio.sleep(REPORT_INTERVAL)
+            latencies = sorted(receiver.latencies)
+            receiver.latencies = []
+            values = "  ".join(f"{name}={value:g}" for name, (_, _, value) in sorted(receiver.latest.items()))
+            print(f"{values}  | received {receiver.received}, lost {receiver.lost}, stale {receiver.stale}, "
+                  f"latency p50 {percentile(latencies, 50):.1f} ms p99 {percentile(latencies, 99):.1f} ms")
+    finally:
+        transport.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local receiver for the live UDP uplink")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--loss", type=float, default=0.0, help="probability of dropping a datagram")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(run(args.host, args.port, args.loss))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
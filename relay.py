@@ -0,0 +1,170 @@
+import argparse
+import asyncio
+import collections
+import json
+
+import websockets
+
+# === Relay Configuration ===
+DEFAULT_PORT = 8765
+SUBSCRIBER_QUEUE = 256  # messages buffered per dashboard, the oldest are dropped when it's full
+DEFAULT_VEHICLE = "default"  # the app's WEBSOCKET_URL has no path, it's this vehicle
+REPORT_INTERVAL = 10.0  # seconds between printed reports, 0 disables them
+
+
+def relay_error(text):
+    """ Reports a problem to a dashboard, in the same frame format as the telemetry """
+    return json.dumps({"command": "RELAY_ERROR", "value": text})
+
+
+# === Subscribers ===
+class Subscriber:
+    """
+        A dashboard's bounded outbox. The vehicle's reader never waits on a
+        dashboard: messages are queued, and a slow dashboard loses the oldest
+        ones instead of slowing the vehicle or the other dashboards down.
+    """
+
+    def __init__(self, ws, size=SUBSCRIBER_QUEUE):
+        self.ws = ws
+        self.queue = collections.deque(maxlen=size)
+        self.sent = 0
+        self.dropped = 0
+        self.__ready = asyncio.Event()
+
+    def put(self, message):
+        if len(self.queue) == self.queue.maxlen:
+            self.dropped += 1
+        self.queue.append(message)
+        self.__ready.set()
+
+    async def run(self):
+        while True:
+            await self.__ready.wait()
+            self.__ready.clear()
+            while self.queue:
+                try:
+                    await self.ws.send(self.queue.popleft())
+                except websockets.ConnectionClosed:
+                    return
+                self.sent += 1
+
+
+# === Relay ===
+class Relay:
+    """
+        The server side of the telemetry websocket, for testing the whole system locally.
+        - vehicles connect on "/" or "/vehicle/<id>" and send {"command", "value"}
+          JSON (or binary batches), fanned out as-is to that vehicle's dashboards
+        - dashboards connect on "/dashboard/<id>" ("/dashboard" for the default
+          vehicle), and whatever they send (modes, watch:/unwatch:) goes to the vehicle
+    """
+
+    def __init__(self, queue_size=SUBSCRIBER_QUEUE):
+        self.queue_size = queue_size
+        self.vehicles = {}  # vehicle id: websocket
+        self.subscribers = {}  # vehicle id: set of Subscriber
+        self.received = 0
+        self.routed = 0  # commands sent to vehicles
+        self.connections = 0
+        self.__gone_sent = 0  # counters of the subscribers that disconnected
+        self.__gone_dropped = 0
+
+    @property
+    def sent(self):
+        return self.__gone_sent + sum(s.sent for subs in self.subscribers.values() for s in subs)
+
+    @property
+    def dropped(self):
+        return self.__gone_dropped + sum(s.dropped for subs in self.subscribers.values() for s in subs)
+
+    async def handler(self, ws):
+        self.connections += 1
+        parts = [part for part in ws.request.path.split("?")[0].split("/") if part]
+        role = parts[0] if parts else "vehicle"
+        vehicle = parts[1] if len(parts) > 1 else DEFAULT_VEHICLE
+        if role == "vehicle":
+            await self.vehicle_handler(ws, vehicle)
+        elif role == "dashboard":
+            await self.dashboard_handler(ws, vehicle)
+        else:
+            await ws.close(1008, f"Unknown path {ws.request.path}")
+
+    async def vehicle_handler(self, ws, vehicle):
+        previous = self.vehicles.get(vehicle)
+        self.vehicles[vehicle] = ws
+        if previous is not None:
+            await previous.close(1000, "Replaced by a new connection")
+        try:
+            async for message in ws:
+                self.received += 1
+                for subscriber in self.subscribers.get(vehicle, ()):
+                    subscriber.put(message)
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            if self.vehicles.get(vehicle) is ws:
+                del self.vehicles[vehicle]
+
+    async def dashboard_handler(self, ws, vehicle):
+        subscriber = Subscriber(ws, self.queue_size)
+        self.subscribers.setdefault(vehicle, set()).add(subscriber)
+        writer = asyncio.create_task(subscriber.run())
+        try:
+            async for message in ws:
+                target = self.vehicles.get(vehicle)
+                if target is None:
+                    subscriber.put(relay_error(f"Vehicle {vehicle} is not connected, dropped: {message}"))
+                    continue
+                try:
+                    await target.send(message)
+                    self.routed += 1
+                except websockets.ConnectionClosed:
+                    # the vehicle went away, not the dashboard: tell it, keep it connected
+                    subscriber.put(relay_error(f"Vehicle {vehicle} disconnected, dropped: {message}"))
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            writer.cancel()
+            subscribers = self.subscribers[vehicle]
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self.subscribers[vehicle]
+            self.__gone_sent += subscriber.sent
+            self.__gone_dropped += subscriber.dropped
+
+    def report(self):
+        dashboards = sum(len(subs) for subs in self.subscribers.values())
+        return (f"{len(self.vehicles)} vehicles, {dashboards} dashboards | received {self.received}, "
+                f"sent {self.sent}, dropped {self.dropped}, commands {self.routed}")
+
+
+async def serve(host, port, queue_size=SUBSCRIBER_QUEUE, report_interval=REPORT_INTERVAL, on_ready=None):
+    relay = Relay(queue_size)
+    async with websockets.serve(relay.handler, host, port) as server:
+        port = server.sockets[0].getsockname()[1]
+        print(f"Relay listening on ws://{host}:{port}")
+        if on_ready is not None:
+            on_ready(port)
+        while True:
+            await asyncio.sleep(report_interval or 3600)
+            if report_interval:
+                print(relay.report())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reference relay server for the telemetry websocket")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--queue", type=int, default=SUBSCRIBER_QUEUE, help="messages buffered per dashboard")
+    parser.add_argument("--report", type=float, default=REPORT_INTERVAL, help="seconds between reports, 0 disables them")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.queue, args.report))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
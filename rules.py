@@ -0,0 +1,79 @@
+import time
+
+
+# === Rules ===
+class Rule:
+    """
+        A condition over one channel's live values, e.g. COOLANT_TEMP above 110.
+        - above / below: thresholds, with clear_below / clear_above as the
+          hysteresis band the value must get back past before the rule clears
+        - when: any other predicate, e.g. a non-empty DTC list
+        - hold: seconds the condition must last before the rule fires
+        While it holds, the rule's LED mode is shown.
+    """
+
+    def __init__(self, name, channel, mode, above=None, below=None,
+                 clear_below=None, clear_above=None, when=None, hold=0.0):
+        self.name = name
+        self.channel = channel
+        self.mode = mode
+        self.above = above
+        self.below = below
+        self.clear_below = above if clear_below is None else clear_below
+        self.clear_above = below if clear_above is None else clear_above
+        self.when = when
+        self.hold = hold
+
+    def check(self, value, active):
+        """ Returns whether the rule holds for this value, given whether it already did """
+        if self.when is not None:
+            return bool(self.when(value))
+        if not isinstance(value, (int, float)):
+            return active
+        if self.above is not None:
+            return value > (self.clear_below if active else self.above)
+        if self.below is not None:
+            return value < (self.clear_above if active else self.below)
+        return False
+
+
+class RulesEngine:
+    """ Evaluates the rules on every sample of their channel, and reports when one fires or clears """
+
+    def __init__(self, rules, on_change):
+        self.rules = rules
+        self.on_change = on_change  # called with (rule, active, value)
+        self.active = set()  # names of the rules currently firing
+        self.__since = {}  # rule name: when its condition started holding
+        self.__by_channel = {}
+        for rule in rules:
+            self.__by_channel.setdefault(rule.channel, []).append(rule)
+
+    def add(self, name, value, timestamp=None):
+        now = time.monotonic() if timestamp is None else timestamp
+        for rule in self.__by_channel.get(name, ()):
+            active = rule.name in self.active
+            try:
+                holds = rule.check(value, active)
+            except (TypeError, ValueError):
+                continue  # a value this rule can't judge, keep its state
+
+            if not holds:
+                self.__since.pop(rule.name, None)
+                if active:
+                    self.active.discard(rule.name)
+                    self.on_change(rule, False, value)
+                continue
+
+            since = self.__since.setdefault(rule.name, now)
+            if not active and now - since >= rule.hold:
+                self.active.add(rule.name)
+                self.on_change(rule, True, value)
+
+    def reset(self):
+        """ Clears every firing rule, e.g. when the car is parked """
+        for rule in self.rules:
+            if rule.name in self.active:
+                self.active.discard(rule.name)
+                self.on_change(rule, False, None)
+        self.__since = {}
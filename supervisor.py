@@ -0,0 +1,282 @@
+import asyncio
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+
+import obd
+
+import application as app
+import logs
+
+# === Supervisor Configuration ===
+TELEMETRY_QUEUE_SIZE = 1000
+MODE_QUEUE_SIZE = 10
+RESTART_DELAY = 2
+MAX_RESTART_DELAY = 60
+STABLE_RUN_TIME = 30  # seconds a role must stay up before its restart delay resets
+
+# mode queue messages from the OBD role, next to the LED modes
+PARKED = "parked"
+AWAKE = "awake"
+
+logger = logging.getLogger("supervisor")
+
+
+# === Roles ===
+# Each role runs in its own process, so the OBD parsing, the LED loops and the
+# websocket traffic each get their own interpreter (and GIL) on the Pi's cores.
+def obd_role(telemetry_queue, mode_queue, watch_queue):
+    app.setup_logging("obd")
+
+    def publish(message):
+        try:
+            telemetry_queue.put_nowait(message)
+        except queue.Full:
+            pass  # networking is behind, never stall the serial link for it
+
+    def send_mode(message):
+        try:
+            mode_queue.put_nowait(message)
+        except queue.Full:
+            # a stuck LED process must not stall the serial link
+            logger.warning("LED process is not draining modes, dropped: %s", message)
+
+    parked = False
+
+    def on_park(state):
+        nonlocal parked
+        parked = state
+        # the LED process blanks the strip and restores its mode on its own
+        send_mode(PARKED if state else AWAKE)
+
+    def on_rule(name, mode, active):
+        send_mode((name, mode, active))
+
+    def follow_watches():
+        while True:
+            message = watch_queue.get()
+            if message.startswith("debug:"):
+                app.set_debug(message)
+            else:
+                app.set_watch(message)
+
+    async def run():
+        tasks = [app.obd_handler(publish=publish, on_park=on_park, on_rule=on_rule)]
+        if app.METRICS_INTERVAL:
+            # snapshots go through the telemetry queue, the network process adds its spans
+            tasks.append(app.metrics_reporter(publish=publish, is_parked=lambda: parked))
+        await asyncio.gather(*tasks)
+
+    threading.Thread(target=follow_watches, daemon=True).start()
+    asyncio.run(run())
+
+
+def led_role(led_queue):
+    app.setup_logging("led")
+    app.init_strip()
+
+    def follow_mode():
+        while True:
+            mode = led_queue.get()
+            if isinstance(mode, tuple):
+                app.show_rule(*mode)  # a local rule fired or cleared
+            elif mode in (PARKED, AWAKE):
+                app.park_leds(mode == PARKED)
+            elif mode in app.RUN_MODE:
+                app.set_mode(mode)
+
+    threading.Thread(target=follow_mode, daemon=True).start()
+    app.run_mode()
+
+
+def network_role(telemetry_queue, mode_queue, watch_queue):
+    app.setup_logging("network")
+
+    def forward_mode(mode):
+        try:
+            mode_queue.put_nowait(mode)
+        except queue.Full:
+            logger.warning("LED process is not draining modes, dropped: %s", mode)
+
+    def forward_watch(message):
+        try:
+            watch_queue.put_nowait(message)
+        except queue.Full:
+            logger.warning("OBD process is not draining watch requests, dropped: %s", message)
+
+    def forward_debug(message):
+        # the OBD process logs the most, it follows the watch queue
+        app.set_debug(message)
+        forward_watch(message)
+
+    async def forward_telemetry():
+        loop = asyncio.get_running_loop()
+        while True:
+            message = await loop.run_in_executor(None, telemetry_queue.get)
+            if isinstance(message, dict):
+                message = app.metrics_frame(message)  # a metrics snapshot from the OBD process
+            await app.send_data(message)
+
+    if app.METRICS_INTERVAL:
+        obd.metrics.enable()  # send spans and reconnect times, reported with the OBD process' metrics
+
+    async def run():
+        await asyncio.gather(
+            app.websocket_handler(on_mode=forward_mode, on_watch=forward_watch, on_debug=forward_debug),
+            forward_telemetry()
+        )
+
+    asyncio.run(run())
+
+
+# === Supervisor ===
+class LedState:
+    """
+        The supervisor's copy of what the LED process shows: the latest mode,
+        the firing rules and whether the car is parked. The other roles' mode
+        messages pass through it on their way to the LED process, and a
+        restarted LED process gets it replayed instead of starting over.
+    """
+
+    def __init__(self, led_queue, mode=app.current_mode):
+        self.led_queue = led_queue
+        self.mode = mode
+        self.parked = False
+        self.rules = {}  # rule name: LED mode, of the rules firing, oldest first
+        self.__lock = threading.Lock()
+
+    def update(self, message):
+        """ Follows a mode message the way the LED process does """
+        if isinstance(message, tuple):
+            name, mode, active = message
+            if self.parked:
+                return
+            if active:
+                self.rules[name] = mode
+            else:
+                self.rules.pop(name, None)
+        elif message in (PARKED, AWAKE):
+            self.parked = message == PARKED
+        elif message in app.RUN_MODE:
+            self.mode = message
+
+    def messages(self):
+        """ The mode messages that bring a new LED process to the current state """
+        messages = [self.mode] + [(name, mode, True) for name, mode in self.rules.items()]
+        if self.parked:
+            messages.append(PARKED)
+        return messages
+
+    def forward(self, message):
+        with self.__lock:
+            self.update(message)
+            self.__put(message)
+
+    def replay(self):
+        """ Drops what a dead LED process left queued, and queues the current state for the next one """
+        with self.__lock:
+            try:
+                while True:
+                    self.led_queue.get_nowait()
+            except queue.Empty:
+                pass
+            for message in self.messages():
+                self.__put(message)
+
+    def __put(self, message):
+        try:
+            self.led_queue.put_nowait(message)
+        except queue.Full:
+            logger.warning("LED process is not draining modes, dropped: %s", message)
+
+
+def follow_modes(mode_queue, led_state):
+    """ Passes the other roles' mode messages on to the LED process, keeping track of its state """
+    while True:
+        led_state.forward(mode_queue.get())
+
+
+class Role:
+    def __init__(self, name, target, args, on_start=None):
+        self.name = name
+        self.target = target
+        self.args = args
+        self.on_start = on_start  # called before every (re)start of the process
+        self.process = None
+        self.started_at = 0.0
+        self.restart_delay = RESTART_DELAY
+        self.restart_at = 0.0
+        self.restarts = 0
+
+    def start(self):
+        if self.on_start is not None:
+            self.on_start()
+        self.process = multiprocessing.Process(target=self.target, args=self.args,
+                                                name=self.name, daemon=True)
+        self.process.start()
+        self.started_at = time.monotonic()
+        logger.info("Started %s (pid %d)", self.name, self.process.pid)
+
+    def check(self):
+        """ Restarts the role if its process died, backing off on crash loops """
+        if self.process is not None and self.process.is_alive():
+            return
+
+        now = time.monotonic()
+        if self.process is not None:
+            if now - self.started_at > STABLE_RUN_TIME:
+                self.restart_delay = RESTART_DELAY
+            logger.warning("%s exited with code %s, restarting in %s seconds...",
+                           self.name, self.process.exitcode, self.restart_delay)
+            self.restart_at = now + self.restart_delay
+            self.restart_delay = min(self.restart_delay * 2, MAX_RESTART_DELAY)
+            self.restarts += 1
+            self.process = None
+
+        if now >= self.restart_at:
+            self.start()
+
+    def stop(self):
+        if self.process is not None and self.process.is_alive():
+            self.process.terminate()
+            self.process.join(timeout=2)
+
+
+def supervise():
+    telemetry_queue = multiprocessing.Queue(TELEMETRY_QUEUE_SIZE)
+    mode_queue = multiprocessing.Queue(MODE_QUEUE_SIZE)  # from the network and OBD roles
+    led_queue = multiprocessing.Queue(MODE_QUEUE_SIZE)
+    watch_queue = multiprocessing.Queue(MODE_QUEUE_SIZE)
+
+    led_state = LedState(led_queue)
+    threading.Thread(target=follow_modes, args=(mode_queue, led_state), daemon=True).start()
+
+    roles = [
+        Role("led", led_role, (led_queue,), on_start=led_state.replay),
+        Role("network", network_role, (telemetry_queue, mode_queue, watch_queue)),
+        Role("obd", obd_role, (telemetry_queue, mode_queue, watch_queue)),
+    ]
+
+    try:
+        while True:
+            for role in roles:
+                role.check()
+            time.sleep(1)
+    finally:
+        for role in roles:
+            role.stop()
+
+
+if __name__ == "__main__":
+    app.setup_logging("supervisor")
+    try:
+        app.bind_rfcomm()
+        supervise()
+    except KeyboardInterrupt:
+        logger.info("Exiting...")
+        app.init_strip()
+        app.clear_strip()
+    finally:
+        logs.stop()
@@ -0,0 +1,56 @@
+from aggregator import Aggregator
+
+
+def collect(**options):
+    emitted = []
+    return Aggregator(emitted.append, **options), emitted
+
+
+def test_one_summary_per_window_keeps_the_peaks():
+    aggregator, emitted = collect(windows={"RPM": 1.0})
+    for i, value in enumerate([800, 4200, 900, 1000]):
+        aggregator.add("RPM", value, i * 0.25)
+
+    assert emitted == []  # the window is still open
+
+    aggregator.add("RPM", 1100, 1.0)  # opens the next window
+
+    assert emitted == [{"command": "RPM", "value": 1000, "min": 800, "max": 4200,
+                        "mean": 1725.0, "count": 4, "window": 1.0}]
+    assert aggregator.received == 5 and aggregator.emitted == 1
+
+
+def test_flush_emits_ended_windows_of_quiet_pids():
+    aggregator, emitted = collect(windows={"default": 2.0, "SPEED": 1.0})
+    aggregator.add("RPM", 800, 0.0)
+    aggregator.add("SPEED", 50, 0.0)
+
+    aggregator.flush(now=1.5)
+    assert [summary["command"] for summary in emitted] == ["SPEED"]
+
+    aggregator.flush(now=1.6, force=True)
+    assert [summary["command"] for summary in emitted] == ["SPEED", "RPM"]
+
+
+def test_raw_values_only_when_changed_or_kept_alive():
+    aggregator, emitted = collect(raw=["FUEL_STATUS"], keepalive=10.0)
+    samples = [("FUEL_STATUS", "closed", 0.0), ("FUEL_STATUS", "closed", 5.0),
+               ("FUEL_STATUS", "open", 6.0), ("FUEL_STATUS", "open", 16.0),
+               ("GET_DTC", "[]", 0.0), ("GET_DTC", "[]", 1.0)]
+    for name, value, timestamp in samples:
+        aggregator.add(name, value, timestamp)
+
+    # non-numeric values are raw without being listed
+    assert emitted == [{"command": "FUEL_STATUS", "value": "closed"},
+                       {"command": "FUEL_STATUS", "value": "open"},
+                       {"command": "FUEL_STATUS", "value": "open"},
+                       {"command": "GET_DTC", "value": "[]"}]
+
+
+def test_forced_flush_resends_unchanged_raw_values():
+    aggregator, emitted = collect()
+    aggregator.add("GET_DTC", "[]", 0.0)
+    aggregator.flush(now=1.0, force=True)
+    aggregator.add("GET_DTC", "[]", 2.0)
+
+    assert len(emitted) == 2
@@ -0,0 +1,56 @@
+import threading
+import time
+
+import obd
+from obd.asynchronous import Dispatcher
+
+from emulator import ELM327Emulator
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_dispatcher_drops_the_oldest_when_behind():
+    dispatcher = Dispatcher(2)
+    seen = []
+
+    for value in range(3):
+        dispatcher.put((seen.append,), value)  # not started: nothing drains
+    dispatcher.start()
+
+    assert wait_for(lambda: len(seen) == 2)
+    dispatcher.stop()
+    assert seen == [1, 2]
+    assert dispatcher.overflows == 1
+
+
+def test_live_watch_and_unwatch():
+    with ELM327Emulator("6") as emulator:
+        connection = obd.Async(emulator.port_name, delay_cmds=0.01, dispatch_size=10, history_size=50)
+        threads = []
+        try:
+            connection.watch(obd.commands.RPM, callback=lambda r: threads.append(threading.current_thread()))
+            connection.start()
+
+            assert wait_for(lambda: not connection.query(obd.commands.RPM).is_null())
+            assert len(connection.history(obd.commands.RPM)[1]) > 0
+            # callbacks run on the dispatcher's thread, not the polling one
+            assert wait_for(lambda: threads)
+            assert all(thread is connection.dispatcher._Dispatcher__thread for thread in threads)
+
+            # watched and unwatched while running: picked up from the next cycle
+            connection.watch(obd.commands.SPEED)
+            connection.unwatch(obd.commands.RPM)
+            assert wait_for(lambda: not connection.query(obd.commands.SPEED).is_null())
+            time.sleep(0.2)  # a few more cycles: the unwatched PID must stay unwatched
+        finally:
+            connection.close()
+
+    assert connection.query(obd.commands.RPM).is_null()
+    assert len(connection.history(obd.commands.RPM)[0]) == 0
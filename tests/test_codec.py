@@ -0,0 +1,60 @@
+import math
+
+import pytest
+
+import codec
+
+
+def test_series_round_trip():
+    timestamps = [1700000000000 + i * 250 + (i % 3) * 7 for i in range(200)]
+    values = [800.0 + math.sin(i / 10) * 300 for i in range(200)]
+    values[50:60] = [values[49]] * 10  # repeated values take the 1 bit path
+
+    data = codec.encode_series(timestamps, values)
+
+    assert codec.decode_series(data, len(timestamps)) == (timestamps, values)
+
+
+def test_series_round_trip_every_bucket():
+    # delta-of-deltas landing in each bucket, both signs, and the bucket edges
+    deltas = [100, 100, 164, 100, 356, 100, 2148, 100, -1900, 10 ** 9, 100, 2 ** 31 + 100]
+    timestamps = [0]
+    for delta in deltas:
+        timestamps.append(timestamps[-1] + delta)
+    values = [float(i) for i in range(len(timestamps))]
+
+    data = codec.encode_series(timestamps, values)
+
+    assert codec.decode_series(data, len(timestamps)) == (timestamps, values)
+
+
+def test_series_rejects_delta_of_delta_beyond_32_bits():
+    with pytest.raises(ValueError):
+        codec.encode_series([0, 1000, 2 ** 33], [1.0, 2.0, 3.0])
+
+
+def test_batch_round_trip():
+    series = {
+        "RPM": ([0, 250, 500], [800.0, 812.5, 790.0]),
+        "SPEED": ([0, 1000], [0.0, 3.0]),
+    }
+
+    assert codec.decode_batch(codec.encode_batch(series)) == series
+
+
+def test_batch_splits_at_clock_jump():
+    batch = codec.Batch()
+    batch.add("RPM", 0.0, 800)
+    batch.add("RPM", 1.0, 810)
+    batch.add("SPEED", 1.0, 5)
+    batch.add("RPM", 1700000000.0, 820)  # the clock was set
+    batch.add("RPM", 1700000001.0, 830)
+
+    frames = batch.encode()
+
+    assert [codec.decode_batch(frame) for frame in frames] == [
+        {"RPM": ([0, 1000], [800.0, 810.0]), "SPEED": ([1000], [5.0])},
+        {"RPM": ([1700000000000, 1700000001000], [820.0, 830.0])},
+    ]
+    assert batch.samples == 0
+    assert batch.encode() == []
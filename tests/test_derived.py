@@ -0,0 +1,67 @@
+import pytest
+
+from derived import MAX_GAP, Derived, DerivedEngine, Integral
+
+
+def collect(channels):
+    emitted = []
+    return DerivedEngine(channels, lambda name, value: emitted.append((name, value))), emitted
+
+
+def test_channels_build_on_each_other():
+    channels = [
+        Derived("DOUBLE", ["SPEED"], lambda speed: speed * 2),
+        Derived("SUM", ["DOUBLE", "RPM"], lambda double, rpm: double + rpm),
+    ]
+    engine, emitted = collect(channels)
+
+    engine.add("SPEED", 10, 0.0)  # SUM still misses RPM
+    engine.add("RPM", 800, 1.0)
+
+    assert emitted == [("DOUBLE", 20), ("SUM", 820)]
+    assert engine.inputs == {"SPEED", "RPM"}  # not its own DOUBLE
+
+
+def test_none_and_non_numeric_values_emit_nothing():
+    engine, emitted = collect([Derived("ECONOMY", ["SPEED"], lambda speed: None if speed < 5 else speed)])
+
+    engine.add("SPEED", 2, 0.0)
+    engine.add("SPEED", "NO DATA", 1.0)
+
+    assert emitted == []
+
+
+def test_integral_uses_the_trapezoid_rule():
+    distance = Integral("DISTANCE", ["SPEED"], lambda speed: speed, per=3600)
+    engine, emitted = collect([distance])
+
+    for timestamp, speed in [(0.0, 0), (2.0, 36), (4.0, 36)]:
+        engine.add("SPEED", speed, timestamp)
+
+    # 0 -> 36 km/h over 2 s, then 36 km/h for 2 s: 10 m + 20 m
+    assert [name for name, _ in emitted] == ["DISTANCE"] * 3
+    assert emitted[-1][1] == pytest.approx(0.03)
+
+
+def test_integral_does_not_bridge_gaps():
+    distance = Integral("DISTANCE", ["SPEED"], lambda speed: speed, per=3600)
+    engine, _ = collect([distance])
+
+    engine.add("SPEED", 36, 0.0)
+    engine.add("SPEED", 36, 1.0 + MAX_GAP)  # parked meanwhile
+    engine.add("SPEED", 36, 2.0 + MAX_GAP)
+
+    assert distance.total == pytest.approx(0.01)
+
+
+def test_reset_starts_a_new_trip():
+    distance = Integral("DISTANCE", ["SPEED"], lambda speed: speed, per=3600)
+    engine, _ = collect([distance])
+    engine.add("SPEED", 36, 0.0)
+    engine.add("SPEED", 36, 1.0)
+
+    engine.reset()
+    engine.add("SPEED", 36, 100.0)
+
+    assert distance.total == 0.0
+    assert engine.values == {"SPEED": 36, "DISTANCE": 0.0}
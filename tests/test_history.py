@@ -0,0 +1,48 @@
+import time
+
+from obd.history import History
+
+
+def test_keeps_the_newest_samples_oldest_first():
+    history = History(4)
+    for i in range(6):
+        history.append(100.0 + i, i * 10.0)
+
+    times, values = history.window()
+
+    assert len(history) == 4
+    assert list(times) == [102.0, 103.0, 104.0, 105.0]
+    assert list(values) == [20.0, 30.0, 40.0, 50.0]
+
+
+def test_window_of_the_last_seconds():
+    history = History(8)
+    for i in range(12):
+        history.append(100.0 + i, float(i))
+
+    times, values = history.window(seconds=3, now=111.0)
+
+    assert list(times) == [108.0, 109.0, 110.0, 111.0]
+    assert list(values) == [8.0, 9.0, 10.0, 11.0]
+
+
+def test_window_counts_back_from_now():
+    history = History(8)
+    now = time.time()
+    history.append(now - 20, 1.0)
+    history.append(now - 15, 2.0)
+
+    # the PID stopped answering 15 s ago: nothing in the last 10 s
+    times, values = history.window(seconds=10)
+
+    assert len(times) == 0 and len(values) == 0
+    assert list(history.window(seconds=30)[1]) == [1.0, 2.0]
+
+
+def test_clear():
+    history = History(4)
+    history.append(1.0, 1.0)
+    history.clear()
+
+    assert len(history) == 0
+    assert list(history.window()[0]) == []
@@ -0,0 +1,116 @@
+import os
+import select
+import socket
+import threading
+
+import obd
+import pytest
+import serial
+from obd.transports import protocol_rfcomm
+
+from emulator import ELM327Emulator
+
+URL = "rfcomm://dd:0d:30:48:a4:9c?channel=3"
+
+
+@pytest.fixture
+def adapter(monkeypatch):
+    """ The adapter's end of a socketpair standing in for the RFCOMM socket, and the connects asked for """
+    ours, theirs = socket.socketpair()
+    connects = []
+
+    def connect(self, address, channel):
+        connects.append((address, channel))
+        return ours
+
+    monkeypatch.setattr(protocol_rfcomm.Serial, "_connect", connect)
+    yield theirs, connects
+    theirs.close()
+    ours.close()
+
+
+def bridge(sock, port_name, stop):
+    """ Copies bytes between the socket and the emulator's pty, like the Bluetooth link would """
+    fd = os.open(port_name, os.O_RDWR | os.O_NOCTTY)
+    try:
+        while not stop.is_set():
+            readable, _, _ = select.select([sock, fd], [], [], 0.1)
+            if sock in readable:
+                data = sock.recv(1024)
+                if not data:
+                    break
+                os.write(fd, data)
+            if fd in readable:
+                sock.sendall(os.read(fd, 1024))
+    finally:
+        os.close(fd)
+
+
+def test_url_options(adapter):
+    _, connects = adapter
+
+    port = serial.serial_for_url(URL, timeout=1)
+
+    assert connects == [("DD:0D:30:48:A4:9C", 3)]
+    assert port.is_open
+    port.close()
+    assert not port.is_open
+
+
+def test_unknown_option(adapter):
+    with pytest.raises(serial.SerialException):
+        serial.serial_for_url("rfcomm://DD:0D:30:48:A4:9C?baud=9600")
+
+
+def test_write_and_read(adapter):
+    theirs, _ = adapter
+    port = serial.serial_for_url(URL, timeout=1)
+
+    port.write(b"ATI\r")
+    assert theirs.recv(1024) == b"ATI\r"
+
+    theirs.sendall(b"ELM327 v1.5\r\r>")
+    assert port.in_waiting > 0
+    assert port.read_until(b">") == b"ELM327 v1.5\r\r>"
+    port.close()
+
+
+def test_read_times_out_with_what_arrived(adapter):
+    theirs, _ = adapter
+    port = serial.serial_for_url(URL, timeout=0.1)
+
+    theirs.sendall(b"NO DA")
+
+    assert port.read(64) == b"NO DA"
+    assert port.read(64) == b""
+    port.close()
+
+
+def test_adapter_closing_the_link(adapter):
+    theirs, _ = adapter
+    port = serial.serial_for_url(URL, timeout=1)
+
+    theirs.close()
+
+    with pytest.raises(serial.SerialException):
+        port.read(1)
+    port.close()
+
+
+def test_obd_session_over_rfcomm(adapter):
+    theirs, _ = adapter
+    stop = threading.Event()
+    with ELM327Emulator("6") as emulator:
+        thread = threading.Thread(target=bridge, args=(theirs, emulator.port_name, stop), daemon=True)
+        thread.start()
+        try:
+            connection = obd.OBD(URL)
+            status = connection.status()
+            response = connection.query(obd.commands.RPM)
+        finally:
+            stop.set()
+            thread.join()
+        connection.close()
+
+    assert status == obd.OBDStatus.CAR_CONNECTED
+    assert not response.is_null()
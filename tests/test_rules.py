@@ -0,0 +1,71 @@
+from rules import Rule, RulesEngine
+
+
+def run(rules, samples):
+    """ Feeds (channel, value, timestamp) samples, returns the (rule name, active) changes """
+    changes = []
+    engine = RulesEngine(rules, lambda rule, active, value: changes.append((rule.name, active)))
+    for name, value, timestamp in samples:
+        engine.add(name, value, timestamp)
+    return engine, changes
+
+
+def test_fires_above_and_clears_below_the_band():
+    rule = Rule("over_rev", "RPM", "pit", above=6000, clear_below=5500)
+    values = [5900, 6100, 5800, 5600, 6050, 5400, 5900]
+
+    _, changes = run([rule], [("RPM", value, i) for i, value in enumerate(values)])
+
+    # 5800 and 5600 are inside the band: no flapping until it drops under 5500
+    assert changes == [("over_rev", True), ("over_rev", False)]
+
+
+def test_below_threshold_with_band():
+    rule = Rule("low_voltage", "ELM_VOLTAGE", "hazard", below=11.5, clear_above=12.0)
+    values = [12.4, 11.4, 11.8, 12.1, 11.9]
+
+    _, changes = run([rule], [("ELM_VOLTAGE", value, i) for i, value in enumerate(values)])
+
+    assert changes == [("low_voltage", True), ("low_voltage", False)]
+
+
+def test_hold_needs_the_condition_to_last():
+    rule = Rule("overheating", "COOLANT_TEMP", "hazard", above=110, clear_below=105, hold=5)
+
+    _, changes = run([rule], [("COOLANT_TEMP", 112, 0), ("COOLANT_TEMP", 100, 3),
+                              ("COOLANT_TEMP", 112, 4), ("COOLANT_TEMP", 113, 8)])
+    assert changes == []  # the dip at 3 s restarted the hold
+
+    _, changes = run([rule], [("COOLANT_TEMP", 112, 10), ("COOLANT_TEMP", 113, 14),
+                              ("COOLANT_TEMP", 111, 15)])
+    assert changes == [("overheating", True)]
+
+
+def test_when_predicate_and_other_channels():
+    rule = Rule("check_engine", "GET_CURRENT_DTC", "hazard", when=lambda dtcs: dtcs != "[]")
+
+    _, changes = run([rule], [("RPM", 900, 0), ("GET_CURRENT_DTC", "[]", 1),
+                              ("GET_CURRENT_DTC", "[('P0300', '')]", 2),
+                              ("GET_CURRENT_DTC", "[('P0300', '')]", 3),
+                              ("GET_CURRENT_DTC", "[]", 4)])
+
+    assert changes == [("check_engine", True), ("check_engine", False)]
+
+
+def test_non_numeric_values_keep_the_state():
+    rule = Rule("over_rev", "RPM", "pit", above=6000, clear_below=5500)
+
+    _, changes = run([rule], [("RPM", 6100, 0), ("RPM", None, 1), ("RPM", "NO DATA", 2)])
+
+    assert changes == [("over_rev", True)]
+
+
+def test_reset_clears_firing_rules():
+    rule = Rule("over_rev", "RPM", "pit", above=6000, clear_below=5500)
+    engine, changes = run([rule], [("RPM", 6100, 0)])
+
+    engine.reset()
+    engine.add("RPM", 6100, 1)
+
+    assert changes == [("over_rev", True), ("over_rev", False), ("over_rev", True)]
+    assert engine.active == {"over_rev"}
@@ -0,0 +1,46 @@
+import socket
+import time
+
+import obd
+import pytest
+from obd.socketcan import SocketCAN
+
+from emulator import DEFAULT_VIN, SocketCANEmulator, Vehicle
+
+URL = "socketcan://vcan0"
+
+
+@pytest.fixture
+def bus(monkeypatch):
+    """ A socketpair standing in for the CAN bus: datagrams keep the frames apart, like CAN_RAW """
+    ours, theirs = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+    monkeypatch.setattr(SocketCAN, "_open_socket", lambda self, channel: ours)
+    monkeypatch.setattr(SocketCANEmulator, "_open_socket", lambda self, channel: theirs)
+    yield
+    ours.close()
+    theirs.close()
+
+
+@pytest.mark.parametrize("protocol", ["6", "7"])
+def test_multi_frame_answer(bus, protocol):
+    # the VIN takes a first frame, our flow control, then consecutive frames
+    with SocketCANEmulator("vcan0", protocol):
+        connection = obd.OBD(URL, protocol=protocol)
+        status = connection.status()
+        response = connection.query(obd.commands.VIN, force=True)
+        connection.close()
+
+    assert status == obd.OBDStatus.CAR_CONNECTED
+    assert DEFAULT_VIN in str(response.value)
+
+
+def test_physical_addressing_stops_at_the_engine(bus):
+    with SocketCANEmulator("vcan0", "6", vehicle=Vehicle(transmission=True)):
+        connection = obd.OBD(URL, protocol="6", physical_addressing=True, timeout=0.5)
+        start = time.monotonic()
+        response = connection.query(obd.commands.RPM)
+        elapsed = time.monotonic() - start
+        connection.close()
+
+    assert not response.is_null()
+    assert elapsed < 0.25  # didn't wait out the timeout for the transmission
@@ -0,0 +1,33 @@
+import asyncio
+
+import websockets
+
+from uplink import Connector
+
+
+async def connect_and_drop(stable_time, times, hold=0.0):
+    """ Connects to a server that closes every connection after `hold` seconds, like the app's reconnect loop """
+    async def handler(ws):
+        await asyncio.sleep(hold)
+        await ws.close(1000, "Replaced by a new connection")
+
+    async with websockets.serve(handler, "127.0.0.1", 0) as server:
+        port = server.sockets[0].getsockname()[1]
+        connector = Connector(f"ws://127.0.0.1:{port}", backoff_min=0.01, backoff_max=0.01,
+                              stable_time=stable_time)
+        attempts = []
+        for _ in range(times):
+            async with await connector.connect() as ws:
+                await ws.wait_closed()
+            connector.dropped()
+            connector.delay()
+            attempts.append(connector.attempts)
+        return attempts
+
+
+def test_short_lived_connections_keep_backing_off():
+    assert asyncio.run(connect_and_drop(stable_time=30, times=4)) == [1, 2, 3, 4]
+
+
+def test_stable_connection_resets_the_backoff():
+    assert asyncio.run(connect_and_drop(stable_time=0.05, times=3, hold=0.1)) == [1, 1, 1]
@@ -0,0 +1,324 @@
+import asyncio
+import itertools
+import logging
+import random
+import socket
+import ssl
+import struct
+import time
+from urllib.parse import urlsplit
+
+import websockets
+
+# === Uplink Configuration ===
+DNS_TTL = 300  # seconds a resolved server address is reused before looking it up again
+STABLE_TIME = 30  # seconds a connection must stay up before the retry backoff starts over
+DATAGRAM_MAGIC = b"OL"
+DATAGRAM_VERSION = 1
+# magic, version, sender session, sequence number, timestamp (ms), then the
+# PID name (length prefixed) and its value
+DATAGRAM_HEADER = struct.Struct(">2sBIIQ")
+DATAGRAM_VALUE = struct.Struct(">d")
+
+logger = logging.getLogger("uplink")
+
+
+# === DNS and retries ===
+class Resolver:
+    """
+        Looks a host up on the event loop's resolver thread (never blocking
+        the loop), and caches its addresses for `ttl` seconds.
+    """
+
+    def __init__(self, host, ttl=DNS_TTL):
+        self.host = host
+        self.ttl = ttl
+        self.__addresses = []  # (family, address)
+        self.__resolved_at = None
+
+    async def resolve(self, force=False):
+        """ Returns the cached [(family, address)] of the host, looking them up when stale """
+        now = time.monotonic()
+        if force or not self.__addresses or now - self.__resolved_at > self.ttl:
+            loop = asyncio.get_running_loop()
+            infos = await loop.getaddrinfo(self.host, None, type=socket.SOCK_STREAM)
+            self.__addresses = list(dict.fromkeys((info[0], info[4][0]) for info in infos))
+            self.__resolved_at = now
+        return self.__addresses
+
+    def forget(self):
+        """ The host may have moved, look it up again next time """
+        self.__addresses = []
+
+
+class Backoff:
+    """ Full jitter: a random wait below a ceiling doubled on every failed attempt, so a fleet doesn't retry in lockstep """
+
+    def __init__(self, minimum, maximum):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.attempts = 0  # failed attempts since the last success
+
+    def delay(self):
+        """ Seconds to wait before the next attempt """
+        ceiling = min(self.maximum, self.minimum * 2 ** self.attempts)
+        self.attempts += 1
+        return random.uniform(0, ceiling)
+
+    def reset(self):
+        self.attempts = 0
+
+
+# === TLS ===
+class ResumingContext(ssl.SSLContext):
+    """
+        A client TLS context that offers the last session (ticket) it was given
+        on every new connection, so reconnects do an abbreviated handshake.
+        asyncio creates its TLS objects through wrap_bio() without a session
+        argument, hence the override.
+    """
+
+    session = None
+
+    def wrap_bio(self, incoming, outgoing, server_side=False, server_hostname=None, session=None):
+        return super().wrap_bio(incoming, outgoing, server_side=server_side,
+                                server_hostname=server_hostname,
+                                session=session or self.session)
+
+
+# === WebSocket connector ===
+class Connector:
+    """
+        Opens the websocket to the server, and keeps reconnects cheap on a
+        flaky mobile link:
+        - the server's address is resolved once and cached for DNS_TTL, so a
+          reconnect doesn't wait on a DNS lookup
+        - TLS sessions are resumed (see ResumingContext)
+        - retries use full jitter backoff, starting near zero; it only starts
+          over after a connection stayed up for `stable_time`, so a server
+          closing right after the handshake isn't hammered
+        - short keepalive pings notice a dead link in seconds, not minutes
+        The time from losing the link to the first message sent on the next
+        one is kept in `reconnect_to_send`.
+    """
+
+    def __init__(self, url, backoff_min=0.1, backoff_max=30.0, ping_interval=5, ping_timeout=5,
+                 open_timeout=10, dns_ttl=DNS_TTL, stable_time=STABLE_TIME):
+        self.url = url
+        self.ping_interval = ping_interval
+        self.ping_timeout = ping_timeout
+        self.open_timeout = open_timeout
+        self.stable_time = stable_time
+
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == "wss" else 80)
+        self.ssl = None
+        if parts.scheme == "wss":
+            self.ssl = ResumingContext(ssl.PROTOCOL_TLS_CLIENT)
+            self.ssl.load_default_certs()
+
+        self.resolver = Resolver(self.host, dns_ttl)
+        self.backoff = Backoff(backoff_min, backoff_max)
+        self.connects = 0
+        self.resumed = 0  # connections that resumed a TLS session
+        self.reconnect_to_send = None  # seconds, for the last reconnect
+        self.__connected_at = None
+        self.__dropped_at = None
+
+    @property
+    def attempts(self):
+        """ failed attempts since the last stable connection """
+        return self.backoff.attempts
+
+    async def resolve(self, force=False):
+        """ Returns the cached addresses of the server, looking them up when stale """
+        return [address for _, address in await self.resolver.resolve(force)]
+
+    async def connect(self):
+        """ Returns an open websocket, trying every cached address of the server """
+        error = None
+        for address in await self.resolve():
+            kwargs = {}
+            if self.ssl is not None:
+                kwargs = {"ssl": self.ssl, "server_hostname": self.host}
+            try:
+                ws = await websockets.connect(self.url, host=address, port=self.port,
+                                              ping_interval=self.ping_interval,
+                                              ping_timeout=self.ping_timeout,
+                                              open_timeout=self.open_timeout, **kwargs)
+            except (OSError, asyncio.TimeoutError) as e:
+                error = e
+                continue
+
+            self.__connected_at = time.monotonic()
+            self.connects += 1
+            ssl_object = ws.transport.get_extra_info("ssl_object")
+            if ssl_object is not None and ssl_object.session_reused:
+                self.resumed += 1
+            self.remember_session(ws)
+            return ws
+
+        # the server may have moved, look it up again next time
+        self.resolver.forget()
+        raise error or OSError(f"No address for {self.host}")
+
+    def remember_session(self, ws):
+        """ Keeps the connection's TLS session for the next connect; TLS 1.3 tickets arrive after the handshake """
+        if self.ssl is None or ws.transport is None:
+            return
+        ssl_object = ws.transport.get_extra_info("ssl_object")
+        if ssl_object is not None and ssl_object.session is not None:
+            self.ssl.session = ssl_object.session
+
+    def delay(self):
+        """ Seconds to wait before the next attempt """
+        return self.backoff.delay()
+
+    def dropped(self):
+        """ Call when a connection or an attempt ended; only a connection that lasted stable_time resets the backoff """
+        now = time.monotonic()
+        if self.__connected_at is not None and now - self.__connected_at >= self.stable_time:
+            self.backoff.reset()
+        self.__connected_at = None
+        if self.__dropped_at is None:
+            self.__dropped_at = now
+
+    def sent(self):
+        """ Call after every send; returns the reconnect-to-first-send time on the first one after a drop """
+        if self.__dropped_at is None:
+            return None
+        self.reconnect_to_send = time.monotonic() - self.__dropped_at
+        self.__dropped_at = None
+        return self.reconnect_to_send
+
+
+# === Live datagrams ===
+def encode_datagram(session, sequence, timestamp, name, value):
+    encoded_name = name.encode("utf-8")
+    return (DATAGRAM_HEADER.pack(DATAGRAM_MAGIC, DATAGRAM_VERSION, session, sequence, int(timestamp * 1000))
+            + bytes([len(encoded_name)]) + encoded_name + DATAGRAM_VALUE.pack(value))
+
+
+def decode_datagram(data):
+    """ Returns (session, sequence, timestamp in ms, name, value), or None for anything else """
+    if len(data) < DATAGRAM_HEADER.size + 1 + DATAGRAM_VALUE.size:
+        return None
+    magic, version, session, sequence, timestamp = DATAGRAM_HEADER.unpack_from(data)
+    if magic != DATAGRAM_MAGIC or version != DATAGRAM_VERSION:
+        return None
+    i = DATAGRAM_HEADER.size
+    length = data[i]
+    name = data[i + 1:i + 1 + length].decode("utf-8", "replace")
+    if len(data) != i + 1 + length + DATAGRAM_VALUE.size:
+        return None
+    value, = DATAGRAM_VALUE.unpack_from(data, i + 1 + length)
+    return session, sequence, timestamp, name, value
+
+
+class DatagramSender:
+    """
+        Sends live values as UDP datagrams, one self-contained packet per
+        sample, so a lost packet only loses that sample instead of holding
+        back every later one like on the TCP websocket. Never blocks: when
+        the socket buffer is full the sample is dropped, a newer one follows.
+        The host is resolved by keep_resolved(), on the event loop; samples
+        sent before it has an address are dropped too.
+    """
+
+    def __init__(self, host, port, resolver=None, backoff_min=1.0, backoff_max=60.0):
+        self.port = port
+        self.resolver = resolver or Resolver(host)  # pass the Connector's to share its cache
+        self.backoff = Backoff(backoff_min, backoff_max)
+        self.address = None
+        self.session = random.getrandbits(32)  # tells the receiver the sequence restarted
+        self.sent = 0
+        self.dropped = 0
+        self.__sequence = itertools.count(1)
+        self.__socket = None
+        self.__family = None
+
+    async def keep_resolved(self):
+        """ Resolves the host, retrying with backoff while DNS fails, and again every resolver TTL """
+        while True:
+            try:
+                family, address = (await self.resolver.resolve())[0]
+            except (OSError, IndexError) as e:
+                delay = self.backoff.delay()
+                logger.warning("Live uplink lookup of %s failed: %s, retrying in %.1f seconds",
+                               self.resolver.host, e, delay)
+                await asyncio.sleep(delay)
+                continue
+
+            self.backoff.reset()
+            if family != self.__family:
+                if self.__socket is not None:
+                    self.__socket.close()
+                self.__socket = socket.socket(family, socket.SOCK_DGRAM)
+                self.__socket.setblocking(False)
+                self.__family = family
+            self.address = (address, self.port)
+            await asyncio.sleep(self.resolver.ttl)
+
+    def send(self, name, value, timestamp=None):
+        sequence = next(self.__sequence) & 0xFFFFFFFF
+        if self.address is None:
+            self.dropped += 1  # not resolved yet
+            return
+        data = encode_datagram(self.session, sequence, time.time() if timestamp is None else timestamp,
+                               name, float(value))
+        try:
+            self.__socket.sendto(data, self.address)
+            self.sent += 1
+        except OSError:  # buffer full, no route while the modem reconnects...
+            self.dropped += 1
+
+    def close(self):
+        if self.__socket is not None:
+            self.__socket.close()
+
+
+class LiveReceiver(asyncio.DatagramProtocol):
+    """
+        Receives live datagrams with latest-wins semantics: a packet older
+        than the newest one already seen for its PID (reordered) is dropped.
+        Gaps in the sequence are counted as lost, and the sender-to-receiver
+        latency is kept per packet (meaningful with synchronised clocks).
+    """
+
+    def __init__(self, on_value=None):
+        self.on_value = on_value  # called with (name, value, timestamp in ms)
+        self.latest = {}  # PID name: (sequence, timestamp in ms, value)
+        self.received = 0
+        self.stale = 0
+        self.lost = 0
+        self.latencies = []  # ms
+        self.__session = None
+        self.__highest = 0
+
+    def datagram_received(self, data, address):
+        packet = decode_datagram(data)
+        if packet is None:
+            return
+        session, sequence, timestamp, name, value = packet
+        self.received += 1
+        self.latencies.append(time.time() * 1000 - timestamp)
+
+        if session != self.__session:
+            # the sender restarted, its sequence numbers did too
+            self.__session = session
+            self.__highest = sequence - 1
+            self.latest = {}
+        if sequence > self.__highest:
+            self.lost += sequence - self.__highest - 1
+            self.__highest = sequence
+        else:
+            self.lost = max(self.lost - 1, 0)  # arrived late, it wasn't lost after all
+
+        latest = self.latest.get(name)
+        if latest is not None and sequence <= latest[0]:
+            self.stale += 1
+            return
+        self.latest[name] = (sequence, timestamp, value)
+        if self.on_value is not None:
+            self.on_value(name, value, timestamp)